@@ -1,13 +1,18 @@
-from flask import redirect, url_for, flash
-from flask_admin import Admin
+import threading
+import time
+
+from flask import redirect, url_for, flash, request, g, current_app
+from flask_admin import Admin, BaseView, expose
 from flask_admin.contrib.sqla import ModelView
 from flask_login import current_user
+from sqlalchemy import and_, or_, func, inspect
 
-from extensions import db
-from models import User, Course, Enrollment
+from extensions import db, identity_cache, sql_profiler
+from models import User, Course, Enrollment, WaitlistEntry
+from enrollment import promote_waitlist, publish_seats
 
 
-class AdminOnlyModelView(ModelView):
+class AdminOnlyMixin:
     def is_accessible(self):
         return current_user.is_authenticated and current_user.role == "admin"
 
@@ -16,9 +21,194 @@ class AdminOnlyModelView(ModelView):
         return redirect(url_for("auth.login"))
 
 
+class AdminOnlyModelView(AdminOnlyMixin, ModelView):
+    pass
+
+
+class LargeTableModelView(AdminOnlyModelView):
+    """List views that stay fast on multi-million-row tables.
+
+    * Relationships shown in the list are joined eagerly
+      (``column_select_related_list``).
+    * Unfiltered lists show a row count cached for ``ADMIN_COUNT_CACHE_TTL``
+      seconds; searched or filtered lists skip the count entirely.
+    * Pages are in primary-key order.  On an unfiltered list a page number
+      is turned into a key by reading only the primary key, and the "Next"
+      link pages by key (``?after=<id>``) without any OFFSET.  Searched or
+      filtered lists page numbers the usual way.
+    * Search is a case-insensitive prefix match, served by ``COLLATE
+      NOCASE`` indexes, instead of ``ILIKE '%term%'`` over every row.
+    """
+
+    list_template = "admin/large_list.html"
+    simple_list_pager = True
+    page_size = 50
+    column_default_sort = "id"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._count_lock = threading.Lock()
+        self._count_cache = None  # (expires_at, count)
+
+    def _pk(self):
+        return getattr(self.model, self._primary_key)
+
+    def cached_count(self) -> int:
+        ttl = current_app.config.get("ADMIN_COUNT_CACHE_TTL", 60)
+        now = time.monotonic()
+        with self._count_lock:
+            if self._count_cache and self._count_cache[0] > now:
+                return self._count_cache[1]
+        count = self.session.query(func.count(self._pk())).scalar()
+        with self._count_lock:
+            self._count_cache = (now + ttl, count)
+        return count
+
+    def get_query(self):
+        query = super().get_query()
+        after = g.get("admin_keyset_after")
+        if after is not None:
+            query = query.filter(self._pk() > after)
+        return query
+
+    def get_list(self, page, sort_column, sort_desc, search, filters,
+                 execute=True, page_size=None):
+        page_size = page_size or self.page_size
+        after = request.args.get("after", type=int)
+        if sort_column is not None:
+            after = None  # keys only follow the default order
+        elif after is None and page and not search and not filters:
+            after = (
+                self.session.query(self._pk())
+                .order_by(self._pk())
+                .offset(page * page_size - 1)
+                .limit(1)
+                .scalar()
+            )
+        if after is not None:
+            page = 0
+
+        g.admin_keyset_after = after
+        try:
+            _, data = super().get_list(
+                page, sort_column, sort_desc, search, filters, execute, page_size
+            )
+        finally:
+            g.pop("admin_keyset_after", None)
+
+        count = self.cached_count() if not search and not filters else None
+        return count, data
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        for term in search.split():
+            clauses = []
+            for field, path in self._search_fields:
+                query, joins, alias = self._apply_path_joins(query, joins, path, inner_join=False)
+                column = field if alias is None else getattr(alias, field.key)
+                column = column.collate("NOCASE")
+                clauses.append(and_(column >= term, column < term + "\uffff"))
+            query = query.filter(or_(*clauses))
+        return query, count_query, joins, count_joins
+
+    def next_page_url(self, data):
+        """Keyset link to the page after ``data``, or None on the last page."""
+        if len(data) < self.page_size or request.args.get("sort"):
+            return None
+        args = request.args.to_dict()
+        args.pop("page", None)
+        args["after"] = self.get_pk_value(data[-1])
+        return url_for(".index_view", **args)
+
+
+class UserAdminView(LargeTableModelView):
+    column_list = ["id", "username", "role"]
+    column_sortable_list = ["id", "username"]
+    column_searchable_list = ["username"]
+
+    def after_model_change(self, form, model, is_created):
+        identity_cache.invalidate(model.id)
+
+    def after_model_delete(self, model):
+        identity_cache.invalidate(model.id)
+
+
+class CourseAdminView(LargeTableModelView):
+    column_list = ["id", "code", "title", "teacher.username", "capacity", "enrolled_count"]
+    column_labels = {"teacher.username": "Teacher", "enrolled_count": "Enrolled"}
+    column_select_related_list = [Course.teacher]
+    column_sortable_list = ["id", "code"]
+    column_searchable_list = ["code", "teacher.username"]
+    form_excluded_columns = ["enrolled_count", "updated_at"]
+
+    def after_model_change(self, form, model, is_created):
+        # A raised capacity frees seats for the waitlist.
+        if promote_waitlist(model.id):
+            db.session.commit()
+        publish_seats(model.id)
+
+
+class EnrollmentAdminView(LargeTableModelView):
+    column_list = ["id", "student.username", "course.code", "grade", "grade_points"]
+    column_labels = {
+        "student.username": "Student", "course.code": "Course", "grade_points": "Points",
+    }
+    column_select_related_list = [Enrollment.student, Enrollment.course]
+    column_sortable_list = ["id"]
+    column_searchable_list = ["student.username", "course.code"]
+    column_filters = ["student_id", "course_id"]
+    form_excluded_columns = ["grade_points"]  # derived from grade, see grades.py
+
+    def on_model_change(self, form, model, is_created):
+        if not is_created:
+            # The form sets the relationship; course_id is only synced at
+            # flush, so until then it still names the course being left.
+            history = inspect(model).attrs.course_id.history
+            g.enrollment_moved_from = history.deleted[0] if history.deleted else model.course_id
+
+    def after_model_change(self, form, model, is_created):
+        moved_from = g.pop("enrollment_moved_from", None)
+        if moved_from is not None and moved_from != model.course_id:
+            # The seat left behind goes to that course's waitlist.
+            if promote_waitlist(moved_from):
+                db.session.commit()
+            publish_seats(moved_from)
+        publish_seats(model.course_id)
+
+    def after_model_delete(self, model):
+        if promote_waitlist(model.course_id):
+            db.session.commit()
+        publish_seats(model.course_id)
+
+
+class WaitlistAdminView(LargeTableModelView):
+    column_list = ["id", "student.username", "course.code"]
+    column_labels = {"student.username": "Student", "course.code": "Course"}
+    column_select_related_list = [WaitlistEntry.student, WaitlistEntry.course]
+    column_sortable_list = ["id"]
+    column_filters = ["course_id"]
+
+
+class SqlProfileView(AdminOnlyMixin, BaseView):
+    @expose("/")
+    def index(self):
+        return self.render(
+            "admin/sql_profile.html",
+            endpoints=sql_profiler.snapshot(),
+            identity_stats=identity_cache.stats(),
+        )
+
+    @expose("/reset", methods=["POST"])
+    def reset(self):
+        sql_profiler.reset()
+        flash("SQL profile cleared.", "info")
+        return redirect(url_for(".index"))
+
+
 def init_admin(app):
     admin = Admin(app, name="Admin Panel", template_mode="bootstrap3")
-    admin.add_view(AdminOnlyModelView(User, db.session))
-    admin.add_view(AdminOnlyModelView(Course, db.session))
-    admin.add_view(AdminOnlyModelView(Enrollment, db.session))
+    admin.add_view(UserAdminView(User, db.session))
+    admin.add_view(CourseAdminView(Course, db.session))
+    admin.add_view(EnrollmentAdminView(Enrollment, db.session))
+    admin.add_view(WaitlistAdminView(WaitlistEntry, db.session))
+    admin.add_view(SqlProfileView(name="SQL Profile", endpoint="sql_profile"))
     return admin
@@ -1,32 +1,75 @@
+import os
+
 from flask import Flask, render_template, redirect, url_for
 from flask_login import current_user
+from sqlalchemy import select
 
-from extensions import db, login_manager
+from extensions import (
+    db, login_manager, identity_cache, password_verifier, sql_profiler, seat_broadcaster,
+)
+from identity_cache import CachedUser
 from models import User
 from auth_routes import auth_bp
 from student_routes import student_bp
 from teacher_routes import teacher_bp
+from export_routes import export_bp
 from admin_panel import init_admin
+from database import configure_engine_options, init_engine
+from migrations import upgrade
+from grades import DEFAULT_GRADE_SCALE, DEFAULT_PERCENT_CUTOFFS, DEFAULT_GRADE_BUCKETS
 
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "dev-key"  # change in real use
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///school.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///school.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
+app.config["ENROLLMENT_WAITLIST"] = True
+app.config["CATALOG_PAGE_SIZE"] = 50
+app.config["IDENTITY_CACHE_SIZE"] = 4096
+app.config["IDENTITY_CACHE_TTL"] = 300  # seconds
+app.config["PASSWORD_HASH_METHOD"] = "scrypt:32768:8:1"
+app.config["PASSWORD_POOL_WORKERS"] = os.cpu_count() or 1
+app.config["SQLITE_JOURNAL_MODE"] = "wal"
+app.config["SQLITE_SYNCHRONOUS"] = "normal"
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = 5000
+app.config["DB_POOL_SIZE"] = 8  # one per request thread of a worker
+app.config["ADMIN_COUNT_CACHE_TTL"] = 60  # seconds
+app.config["SEAT_EVENTS_INTERVAL"] = 0.25  # seconds between batched seat updates
+# Letter -> points, percentage cutoffs and histogram buckets; after changing
+# them run `python grades.py` to re-derive stored points and statistics.
+app.config["GRADE_SCALE"] = DEFAULT_GRADE_SCALE
+app.config["GRADE_PERCENT_CUTOFFS"] = DEFAULT_PERCENT_CUTOFFS
+app.config["GRADE_BUCKETS"] = DEFAULT_GRADE_BUCKETS
+
+configure_engine_options(app)
 db.init_app(app)
+init_engine(app, db)
 login_manager.init_app(app)
 login_manager.login_view = "auth.login"
+identity_cache.init_app(app)
+password_verifier.init_app(app)
+sql_profiler.init_app(app, db)
+seat_broadcaster.init_app(app)
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    user = identity_cache.get(user_id)
+    if user is None:
+        row = db.session.execute(
+            select(User.id, User.username, User.role).filter_by(id=user_id)
+        ).first()
+        if row is None:
+            return None
+        user = identity_cache.put(CachedUser(*row))
+    return user
 
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(student_bp)
 app.register_blueprint(teacher_bp)
+app.register_blueprint(export_bp)
 init_admin(app)
 
 
@@ -49,5 +92,5 @@ def not_found(e):
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        upgrade()
     app.run(debug=True)
@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, current_user
 
 from extensions import db
 from models import User
+from passwords import PasswordPoolBusy, needs_rehash
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -17,7 +18,16 @@ def login():
         password = request.form.get("password", "")
 
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except PasswordPoolBusy:
+            flash("The server is busy, please try again.", "error")
+            return render_template("login.html"), 503
+
+        if valid:
+            if needs_rehash(user.password_hash):
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             flash("Welcome back.", "success")
             return redirect(url_for("home"))
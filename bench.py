@@ -0,0 +1,889 @@
+"""Benchmarks and stress tests.
+
+Each benchmark runs against a throwaway SQLite database so it never touches
+``school.db``:
+
+    python bench.py enroll --threads 32 --students 2000 --capacity 150
+    python bench.py login --threads 16 --logins 200
+    python bench.py routes --students 20000 --courses 1000 --enrollments 200000
+    python bench.py concurrency --readers 8 --writers 4 --seconds 5
+    python bench.py search --courses 100000
+    python bench.py sse --subscribers 500 --bursts 20
+    python bench.py grades --edits 2000
+"""
+import argparse
+import atexit
+import random
+import selectors
+import shutil
+import socket
+import fnmatch
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from queue import Queue, Empty
+
+# Point the app at a scratch database before it is imported.
+_workdir = tempfile.mkdtemp(prefix="lab8-bench-")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(_workdir, "bench.db"))
+
+from sqlalchemy import insert, func, select, event  # noqa: E402
+
+from app import app  # noqa: E402
+from extensions import db, identity_cache, password_verifier, seat_broadcaster  # noqa: E402
+from models import User, Course, Enrollment, WaitlistEntry  # noqa: E402
+import enrollment  # noqa: E402
+from enrollment import EnrollResult  # noqa: E402
+from passwords import hash_password  # noqa: E402
+import seed  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from course_search import SearchTooBroad, search_courses  # noqa: E402
+from gradebook import import_grades  # noqa: E402
+import grades  # noqa: E402
+
+
+def _reset_db():
+    db.drop_all()
+    upgrade()
+    identity_cache.clear()
+
+
+def bench_enroll(args):
+    """Many threads race for the seats of one course."""
+    with app.app_context():
+        _reset_db()
+        teacher_id = db.session.execute(
+            insert(User).values(username="t0", password_hash="-", role="teacher")
+        ).inserted_primary_key[0]
+        db.session.execute(
+            insert(User),
+            [
+                {"username": f"s{i}", "password_hash": "-", "role": "student"}
+                for i in range(args.students)
+            ],
+        )
+        course_id = db.session.execute(
+            insert(Course).values(
+                code="HOT101", title="Popular", capacity=args.capacity, teacher_id=teacher_id
+            )
+        ).inserted_primary_key[0]
+        db.session.commit()
+        student_ids = db.session.scalars(select(User.id).filter_by(role="student")).all()
+
+    # Every student tries twice so the duplicate path is exercised as well.
+    work = Queue()
+    for sid in student_ids * 2:
+        work.put(sid)
+
+    results = {r: 0 for r in EnrollResult}
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        local = {r: 0 for r in EnrollResult}
+        with app.app_context():
+            while True:
+                try:
+                    sid = work.get_nowait()
+                except Empty:
+                    break
+                try:
+                    local[enrollment.enroll(sid, course_id, waitlist=args.waitlist)] += 1
+                except Exception as exc:  # keep going, report at the end
+                    db.session.rollback()
+                    errors.append(repr(exc))
+        with lock:
+            for r, n in local.items():
+                results[r] += n
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        rows = db.session.scalar(
+            select(func.count(Enrollment.id)).filter_by(course_id=course_id)
+        )
+        counter = db.session.get(Course, course_id).enrolled_count
+        waitlisted = db.session.scalar(
+            select(func.count(WaitlistEntry.id)).filter_by(course_id=course_id)
+        )
+
+    attempts = len(student_ids) * 2
+    print(f"threads={args.threads} students={len(student_ids)} capacity={args.capacity}")
+    for r, n in results.items():
+        print(f"  {r.value:<20} {n}")
+    print(f"  errors               {len(errors)}")
+    print(f"enrollment rows={rows} counter={counter} waitlist={waitlisted}")
+    print(f"{attempts} attempts in {elapsed:.3f}s ({attempts / elapsed:.0f} attempts/s, "
+          f"{results[EnrollResult.ENROLLED] / elapsed:.0f} enrollments/s)")
+
+    expected = min(args.capacity, len(student_ids))
+    ok = rows == counter == expected and results[EnrollResult.ENROLLED] == expected
+    if args.waitlist:
+        ok = ok and waitlisted == len(student_ids) - expected
+    if errors:
+        print("first error:", errors[0])
+    print("OK: no overbooking" if ok and not errors else "FAILED")
+    return 0 if ok and not errors else 1
+
+
+def _run_threads(n_threads, n_jobs, job):
+    """Run ``job(i)`` for i in range(n_jobs) over a thread pool; return seconds."""
+    work = Queue()
+    for i in range(n_jobs):
+        work.put(i)
+
+    def worker():
+        while True:
+            try:
+                i = work.get_nowait()
+            except Empty:
+                return
+            job(i)
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started
+
+
+def bench_login(args):
+    """Login throughput, inline vs pooled verification, per hash cost."""
+    password = "correct horse"
+    print(f"threads={args.threads} logins={args.logins} cpus={os.cpu_count()}")
+    print(f"{'method':<24} {'mode':<12} {'logins/s':>9} {'ok':>5}")
+    for method in args.methods:
+        app.config["PASSWORD_HASH_METHOD"] = method
+        with app.app_context():
+            _reset_db()
+            pwhash = hash_password(password)
+            db.session.execute(
+                insert(User),
+                [
+                    {"username": f"u{i}", "password_hash": pwhash, "role": "student"}
+                    for i in range(args.users)
+                ],
+            )
+            db.session.commit()
+
+        for workers in (0, args.workers):
+            app.config["PASSWORD_POOL_WORKERS"] = workers
+            app.config["PASSWORD_POOL_MAX_PENDING"] = 4 * max(workers, 1)
+            password_verifier.shutdown()
+            ok = []
+
+            def login(i):
+                client = app.test_client()
+                resp = client.post(
+                    "/auth/login",
+                    data={"username": f"u{i % args.users}", "password": password},
+                )
+                ok.append(resp.status_code == 302)
+
+            login(0)  # warm-up, starts the pool
+            ok.clear()
+            elapsed = _run_threads(args.threads, args.logins, login)
+            mode = "inline" if not workers else f"pool({workers})"
+            print(f"{method:<24} {mode:<12} {args.logins / elapsed:>9.1f} {sum(ok):>5}")
+    password_verifier.shutdown()
+    return 0
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Routes that end the session get a freshly logged-in client per request.
+_SESSION_ENDING = {"auth.logout"}
+
+
+def _route_cases(ids):
+    """(name, role, method, url, form) for every route the suite drives.
+
+    ``form`` may be a callable returning fresh data, for file uploads.  The
+    seat-event stream never ends and is measured by ``bench.py sse``.
+    """
+    course = ids["course"]
+    student = ids["student"]
+
+    def grade_upload():
+        body = f"student_id,grade\n{ids['course_student']},A-\n".encode()
+        return {"file": (io.BytesIO(body), "grades.csv")}
+
+    cases = [
+        ("auth.login GET", None, "GET", "/auth/login", None),
+        ("auth.login POST", None, "POST", "/auth/login",
+         {"username": ids["student_name"], "password": "student"}),
+        ("auth.logout", "student", "GET", "/auth/logout", None),
+        ("home", "student", "GET", "/", None),
+        ("student.my_classes", "student", "GET", "/student/my-classes", None),
+        ("student.all_classes", "student", "GET", "/student/all-classes", None),
+        ("student.all_classes deep", "student", "GET",
+         f"/student/all-classes?after={ids['deep_code']}", None),
+        ("student.search", "student", "GET", "/student/search?q=course+1", None),
+        ("student.enroll", "student", "POST", f"/student/enroll/{ids['open_course']}", None),
+        ("student.drop", "student", "POST", f"/student/drop/{ids['open_course']}", None),
+    ]
+    if ids["full_course"] is not None:
+        cases += [
+            ("student.enroll waitlist", "student", "POST",
+             f"/student/enroll/{ids['full_course']}", None),
+            ("student.leave_waitlist", "student", "POST",
+             f"/student/waitlist/{ids['full_course']}/leave", None),
+        ]
+    cases += [
+        ("teacher.dashboard", "teacher", "GET", "/teacher/", None),
+        ("teacher.course", "teacher", "GET", f"/teacher/course/{course}", None),
+        ("teacher.update_grade", "teacher", "POST", f"/teacher/course/{course}/grade",
+         {"student_id": ids["course_student"], "grade": "B+"}),
+        ("teacher.import_grades_upload", "teacher", "POST",
+         f"/teacher/course/{course}/grades/import", grade_upload),
+        ("export.roster", "teacher", "GET", f"/export/course/{course}/roster.csv", None),
+        ("export.roster ndjson", "teacher", "GET", f"/export/course/{course}/roster.ndjson", None),
+        ("export.transcript", "student", "GET", f"/export/student/{student}/transcript.csv", None),
+        ("export.transcript ndjson", "student", "GET",
+         f"/export/student/{student}/transcript.ndjson", None),
+        ("export.enrollments", "admin", "GET", "/export/enrollments.csv", None),
+        ("export.enrollments ndjson", "admin", "GET", "/export/enrollments.ndjson", None),
+        ("teacher.dashboard (admin)", "admin", "GET", "/teacher/", None),
+        ("admin.index", "admin", "GET", "/admin/", None),
+        ("admin.user", "admin", "GET", "/admin/user/", None),
+        ("admin.course", "admin", "GET", "/admin/course/", None),
+        ("admin.enrollment", "admin", "GET", "/admin/enrollment/", None),
+        ("admin.enrollment deep", "admin", "GET", "/admin/enrollment/?page=500", None),
+        ("admin.enrollment keyset", "admin", "GET",
+         f"/admin/enrollment/?after={ids['deep_enrollment']}", None),
+        ("admin.waitlistentry", "admin", "GET", "/admin/waitlistentry/", None),
+        ("admin.sql_profile", "admin", "GET", "/admin/sql_profile/", None),
+    ]
+    return cases
+
+
+def _pick_ids():
+    teacher_id, course_id = db.session.execute(
+        select(Course.teacher_id, Course.id).order_by(Course.enrolled_count.desc()).limit(1)
+    ).one()
+    course_student = db.session.scalar(
+        select(Enrollment.student_id).filter_by(course_id=course_id).limit(1)
+    )
+    student = db.session.execute(
+        select(User.id, User.username).filter_by(role="student").limit(1)
+    ).one()
+    open_course = db.session.scalar(
+        select(Course.id)
+        .where(
+            Course.enrolled_count < Course.capacity,
+            ~Course.id.in_(select(Enrollment.course_id).filter_by(student_id=student.id)),
+        )
+        .limit(1)
+    )
+    full_course = db.session.scalar(
+        select(Course.id)
+        .where(
+            Course.enrolled_count >= Course.capacity,
+            ~Course.id.in_(select(Enrollment.course_id).filter_by(student_id=student.id)),
+        )
+        .limit(1)
+    )
+    codes = db.session.scalars(select(Course.code).order_by(Course.code)).all()
+    return {
+        "admin": db.session.scalar(select(User.id).filter_by(role="admin").limit(1)),
+        "teacher": teacher_id,
+        "student": student.id,
+        "student_name": student.username,
+        "course": course_id,
+        "course_student": course_student,
+        "open_course": open_course,
+        "full_course": full_course,
+        "deep_code": codes[len(codes) * 3 // 4],
+        "deep_enrollment": db.session.scalar(select(func.max(Enrollment.id))) * 3 // 4,
+    }
+
+
+def bench_routes(args):
+    """Latency percentiles and SQL query counts for every route."""
+    if not args.no_seed:
+        seed.seed_scale(args.students, args.teachers, args.courses, args.enrollments)
+    identity_cache.clear()
+    app.config["PASSWORD_POOL_WORKERS"] = 0
+
+    with app.app_context():
+        ids = _pick_ids()
+        engine = db.engine
+
+    queries = [0]
+
+    def count_query(*_):
+        queries[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count_query)
+
+    def logged_in(user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+            sess["_fresh"] = True
+        return client
+
+    clients = {role: logged_in(ids[role]) for role in ("student", "teacher", "admin")}
+
+    results = []
+    print(f"{'route':<28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'queries':>8}")
+    for name, role, method, url, form in _route_cases(ids):
+        if args.only and not any(fnmatch.fnmatch(name, pat) for pat in args.only):
+            continue
+        latencies = []
+        query_counts = []
+        statuses = set()
+        for _ in range(args.iterations):
+            if name in _SESSION_ENDING:
+                client = logged_in(ids[role])
+            else:
+                client = clients[role] if role else app.test_client()
+            data = form() if callable(form) else form
+            queries[0] = 0
+            started = time.perf_counter()
+            resp = client.open(url, method=method, data=data)
+            resp.get_data()  # drain streamed bodies
+            latencies.append((time.perf_counter() - started) * 1000)
+            query_counts.append(queries[0])
+            statuses.add(resp.status_code)
+        row = {
+            "route": name,
+            "status": sorted(statuses),
+            "p50_ms": round(_percentile(latencies, 50), 3),
+            "p95_ms": round(_percentile(latencies, 95), 3),
+            "p99_ms": round(_percentile(latencies, 99), 3),
+            "max_ms": round(max(latencies), 3),
+            "queries": round(statistics.mean(query_counts), 1),
+        }
+        results.append(row)
+        print(f"{name:<28} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row['max_ms']:>8.2f} {row['queries']:>8}")
+
+    event.remove(engine, "before_cursor_execute", count_query)
+
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": _git_revision(),
+        "sizes": {
+            "students": args.students, "teachers": args.teachers,
+            "courses": args.courses, "enrollments": args.enrollments,
+        },
+        "iterations": args.iterations,
+        "routes": results,
+    }
+    _compare_with_previous(args.output, record)
+    with open(args.output, "a") as fh:
+        fh.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.output}")
+    return 0
+
+
+def _compare_with_previous(path, record):
+    """Print p50 / query-count changes against the last run with the same sizes."""
+    previous = None
+    if os.path.exists(path):
+        with open(path) as fh:
+            for line in fh:
+                entry = json.loads(line)
+                if entry["sizes"] == record["sizes"]:
+                    previous = entry
+    if previous is None:
+        return
+    before = {r["route"]: r for r in previous["routes"]}
+    print(f"\nCompared with {previous['revision']} ({previous['timestamp']}):")
+    for row in record["routes"]:
+        old = before.get(row["route"])
+        if old is None:
+            continue
+        change = (row["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+        print(f"  {row['route']:<28} p50 {change:+7.1f}%  queries {old['queries']} -> {row['queries']}")
+
+
+def _mixed_load(args, course_ids, student_ids):
+    """Readers load rosters and catalog pages while writers enroll and drop."""
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    read_latencies = []
+    lock = threading.Lock()
+
+    def reader(seed_):
+        rng = random.Random(seed_)
+        reads, latencies = 0, []
+        with app.app_context():
+            while not stop.is_set():
+                course_id = rng.choice(course_ids)
+                started = time.perf_counter()
+                db.session.execute(
+                    select(Enrollment.student_id, User.username, Enrollment.grade)
+                    .join(User, User.id == Enrollment.student_id)
+                    .where(Enrollment.course_id == course_id)
+                ).all()
+                db.session.execute(
+                    select(Course.code, Course.enrolled_count, Course.capacity)
+                    .order_by(Course.code)
+                    .limit(50)
+                ).all()
+                db.session.rollback()
+                latencies.append((time.perf_counter() - started) * 1000)
+                reads += 1
+        with lock:
+            counts["reads"] += reads
+            read_latencies.extend(latencies)
+
+    def writer(seed_):
+        rng = random.Random(seed_)
+        writes = errors = 0
+        with app.app_context():
+            while not stop.is_set():
+                course_id, student_id = rng.choice(course_ids), rng.choice(student_ids)
+                try:
+                    if enrollment.enroll(student_id, course_id, waitlist=False) is not EnrollResult.ENROLLED:
+                        enrollment.drop(student_id, course_id)
+                    writes += 1
+                except Exception:
+                    db.session.rollback()
+                    errors += 1
+        with lock:
+            counts["writes"] += writes
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(args.writers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return counts, read_latencies
+
+
+def bench_concurrency(args):
+    """Read/write throughput with the rollback journal versus WAL."""
+    print(f"readers={args.readers} writers={args.writers} seconds={args.seconds}")
+    print(f"{'journal':<8} {'sync':<7} {'reads/s':>9} {'read p95 ms':>12} {'writes/s':>9} {'errors':>7}")
+    for journal, synchronous in (("delete", "full"), ("wal", "normal")):
+        app.config["SQLITE_JOURNAL_MODE"] = journal
+        app.config["SQLITE_SYNCHRONOUS"] = synchronous
+        with app.app_context():
+            db.engine.dispose()  # new connections pick up the pragmas
+        seed.seed_scale(args.students, args.teachers, args.courses, args.enrollments)
+        with app.app_context():
+            db.engine.dispose()
+            course_ids = db.session.scalars(select(Course.id)).all()
+            student_ids = db.session.scalars(select(User.id).filter_by(role="student")).all()
+
+        counts, latencies = _mixed_load(args, course_ids, student_ids)
+        p95 = _percentile(latencies, 95) if latencies else 0.0
+        print(f"{journal:<8} {synchronous:<7} {counts['reads'] / args.seconds:>9.0f} {p95:>12.2f} "
+              f"{counts['writes'] / args.seconds:>9.0f} {counts['errors']:>7}")
+    return 0
+
+
+def bench_search(args):
+    """Latency of ranked prefix search over the FTS index."""
+    seed.seed_scale(args.students, args.teachers, args.courses, args.enrollments)
+    rng = random.Random(0)
+    with app.app_context():
+        teachers = db.session.scalars(select(User.username).filter_by(role="teacher")).all()
+        queries = []
+        for _ in range(args.queries):
+            kind = rng.randrange(3)
+            if kind == 0:
+                queries.append(f"C{rng.randrange(args.courses):06d}"[: rng.randint(3, 7)])
+            elif kind == 1:
+                queries.append(f"course {rng.randrange(args.courses)}"[: rng.randint(8, 12)])
+            else:
+                queries.append(rng.choice(teachers)[: rng.randint(8, 12)])
+
+        latencies = []
+        hits = refused = 0
+        for query in queries:
+            started = time.perf_counter()
+            try:
+                results = search_courses(query)
+            except SearchTooBroad:
+                results = []
+                refused += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += bool(results)
+            db.session.rollback()
+
+    print(f"courses={args.courses} queries={len(queries)} with results={hits} too broad={refused}")
+    print(f"p50 {_percentile(latencies, 50):.2f} ms  p95 {_percentile(latencies, 95):.2f} ms  "
+          f"p99 {_percentile(latencies, 99):.2f} ms  max {max(latencies):.2f} ms")
+    return 0
+
+
+def _session_cookie(user_id):
+    """A signed Flask session cookie logged in as ``user_id``."""
+    serializer = app.session_interface.get_signing_serializer(app)
+    return app.config["SESSION_COOKIE_NAME"], serializer.dumps({"_user_id": str(user_id), "_fresh": True})
+
+
+class _SseClients:
+    """Many raw SSE connections driven by one selector thread."""
+
+    def __init__(self, port, path, cookie, count):
+        self.selector = selectors.DefaultSelector()
+        self.received = []  # (client index, arrival time) per seats event
+        self.opened = 0
+        self._lock = threading.Lock()
+        request = (
+            f"GET {path} HTTP/1.0\r\nHost: localhost\r\n"
+            f"Cookie: {cookie[0]}={cookie[1]}\r\nAccept: text/event-stream\r\n\r\n"
+        ).encode()
+        for i in range(count):
+            sock = socket.create_connection(("127.0.0.1", port))
+            sock.sendall(request)
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, [i, b"", False])
+        self._running = True
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        while self._running:
+            for key, _ in self.selector.select(timeout=0.1):
+                state = key.data
+                try:
+                    chunk = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    self.selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                now = time.perf_counter()
+                # Each SSE message is one HTTP chunk; the chunk framing left
+                # around it does not matter for counting.
+                *events, state[1] = (state[1] + chunk).split(b"\n\n")
+                for message in events:
+                    if b"retry:" in message:
+                        if not state[2]:
+                            state[2] = True
+                            with self._lock:
+                                self.opened += 1
+                    elif b"event: seats" in message:
+                        with self._lock:
+                            self.received.append((state[0], now))
+
+    def take(self):
+        with self._lock:
+            received, self.received = self.received, []
+        return received
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+
+def bench_sse(args):
+    """How many seat-event subscribers one worker holds, and how fast it feeds them."""
+    import logging
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app.config["SEAT_EVENTS_HEARTBEAT"] = 1  # notice closed clients quickly
+    seed.seed_scale(args.students, args.teachers, args.courses, 0)
+    with app.app_context():
+        db.session.execute(
+            Course.__table__.update().values(capacity=args.bursts * args.burst_size + 1)
+        )
+        db.session.commit()
+        course_ids = db.session.scalars(select(Course.id).order_by(Course.code)).all()
+        student_ids = db.session.scalars(select(User.id).filter_by(role="student")).all()
+    page = course_ids[: app.config["CATALOG_PAGE_SIZE"]]
+    cookie = _session_cookie(student_ids[0])
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with app.test_request_context():
+        from flask import url_for
+
+        path = url_for("student.seat_stream", courses=",".join(map(str, page)))
+
+    started = time.perf_counter()
+    clients = _SseClients(server.server_port, path, cookie, args.subscribers)
+    while clients.opened < args.subscribers and time.perf_counter() - started < 60:
+        time.sleep(0.05)
+    connect_s = time.perf_counter() - started
+    print(f"subscribers={args.subscribers} connected={clients.opened} in {connect_s:.2f}s "
+          f"(server threads={threading.active_count()})")
+    if clients.opened < args.subscribers:
+        clients.close()
+        server.shutdown()
+        print("FAILED: not every subscriber connected")
+        return 1
+
+    rng = random.Random(0)
+    pending = iter(rng.sample(student_ids, len(student_ids)))
+    latencies, per_burst, missed = [], [], 0
+    cpu_started = time.process_time()
+    with app.app_context():
+        for _ in range(args.bursts):
+            course_id = rng.choice(page)
+            for _ in range(args.burst_size):
+                enrollment.enroll(next(pending), course_id)
+            burst_done = time.perf_counter()
+            time.sleep(seat_broadcaster.interval * 2 + 0.2)
+            received = clients.take()
+            per_burst.append(len(received))
+            missed += args.subscribers - len({client for client, _ in received})
+            latencies.extend((arrived - burst_done) * 1000 for _, arrived in received)
+    stream_cpu = time.process_time() - cpu_started
+
+    clients.close()
+    server.shutdown()
+
+    delivered = sum(per_burst)
+    enrolls = args.bursts * args.burst_size
+    # A burst that straddles a broadcaster tick arrives as two messages.
+    print(f"{enrolls} enrollments in {args.bursts} bursts of {args.burst_size}: "
+          f"{delivered} messages delivered ({delivered / args.bursts / args.subscribers:.2f} "
+          f"per subscriber per burst, {missed} bursts missed)")
+    if latencies:
+        print(f"delivery after burst p50 {_percentile(latencies, 50):.1f} ms  "
+              f"p95 {_percentile(latencies, 95):.1f} ms  max {max(latencies):.1f} ms")
+    print(f"cpu while streaming {stream_cpu * 1000:.0f} ms "
+          f"({stream_cpu * 1000 / max(delivered, 1):.3f} ms per message)")
+
+    # What the same clients would cost polling the catalog once per burst.
+    client = app.test_client()
+    client.set_cookie(*cookie)
+    cpu_started = time.process_time()
+    for _ in range(args.polls):
+        client.get("/student/all-classes")
+    poll_ms = (time.process_time() - cpu_started) * 1000 / args.polls
+    print(f"catalog poll {poll_ms:.2f} ms cpu each; one poll per subscriber per burst "
+          f"would cost {poll_ms * args.subscribers * args.bursts:.0f} ms")
+
+    ok = not missed and delivered < enrolls * args.subscribers
+    print("OK: every subscriber saw every burst, coalesced" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+_SAMPLE_GRADES = list(grades.DEFAULT_GRADE_SCALE) + ["95", "88.5", "71%", "42", "P", "W", ""]
+
+
+def bench_grades(args):
+    """Incremental course statistics against a recompute, and lookup cost."""
+    seed.seed_scale(args.students, args.teachers, args.courses, args.enrollments)
+    rng = random.Random(0)
+    client = app.test_client()
+    client.set_cookie(*_session_cookie(1))  # the admin owns every course
+
+    with app.app_context():
+        roster = db.session.execute(
+            select(Enrollment.course_id, Enrollment.student_id).order_by(Enrollment.id)
+        ).all()
+        by_course = {}
+        for row in roster:
+            by_course.setdefault(row.course_id, []).append(row.student_id)
+
+        # Bulk grading goes through the import (Core) path.
+        started = time.perf_counter()
+        for course_id, students in by_course.items():
+            rows = (
+                (n, sid, rng.choice(_SAMPLE_GRADES), None)
+                for n, sid in enumerate(students, start=1) if rng.random() < args.graded
+            )
+            import_grades(course_id, rows)
+        print(f"imported grades for {len(roster)} enrollments in "
+              f"{time.perf_counter() - started:.2f}s")
+
+        # Then single edits through every other write path.
+        started = time.perf_counter()
+        counts = {"form": 0, "orm_regrade": 0, "admin_move": 0, "admin_delete": 0, "drop": 0}
+        course_ids = list(by_course)
+        for _ in range(args.edits):
+            course_id = rng.choice(course_ids)
+            if not by_course[course_id]:
+                continue
+            student_id = rng.choice(by_course[course_id])
+            kind = rng.choices(list(counts), weights=(75, 10, 5, 5, 5))[0]
+            if kind == "form":
+                response = client.post(
+                    f"/teacher/course/{course_id}/grade",
+                    data={"student_id": student_id, "grade": rng.choice(_SAMPLE_GRADES)},
+                )
+                if response.status_code != 302:
+                    print(f"grade form returned {response.status_code}")
+                    return 1
+            elif kind == "orm_regrade":
+                # Two edits of one instance; the commit between them expires it.
+                row = db.session.scalars(
+                    select(Enrollment).filter_by(course_id=course_id, student_id=student_id)
+                ).one()
+                for _ in range(2):
+                    row.grade = rng.choice(_SAMPLE_GRADES) or None
+                    db.session.commit()
+            elif kind == "admin_move":
+                target = rng.choice(course_ids)
+                if target == course_id or student_id in by_course[target]:
+                    continue
+                row = db.session.scalars(
+                    select(Enrollment).filter_by(course_id=course_id, student_id=student_id)
+                ).one()
+                row.course_id = target
+                db.session.commit()
+                by_course[target].append(student_id)
+                by_course[course_id].remove(student_id)
+            elif kind == "admin_delete":
+                db.session.delete(db.session.scalars(
+                    select(Enrollment).filter_by(course_id=course_id, student_id=student_id)
+                ).one())
+                db.session.commit()
+                by_course[course_id].remove(student_id)
+            else:
+                enrollment.drop(student_id, course_id)
+                by_course[course_id].remove(student_id)
+            counts[kind] += 1
+        print(f"{sum(counts.values())} edits in {time.perf_counter() - started:.2f}s: "
+              + ", ".join(f"{kind}={n}" for kind, n in counts.items()))
+
+        mismatches = grades.verify_grade_stats()
+        for course_id, bucket, have, want in mismatches[:10]:
+            print(f"  course {course_id} bucket {bucket}: maintained {have}, recomputed {want}")
+
+        # Reading a course's statistics: maintained rows versus parsing every grade.
+        sample = rng.choices(course_ids, k=args.lookups)
+        maintained, scanned = [], []
+        for course_id in sample:
+            started = time.perf_counter()
+            grades.course_stats(course_id)
+            maintained.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            points = [
+                grades.grade_points(g) for g in db.session.scalars(
+                    select(Enrollment.grade).filter_by(course_id=course_id)
+                )
+            ]
+            sum(p for p in points if p is not None)
+            scanned.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            grades.rebuild_grade_stats(conn)
+        rebuild_s = time.perf_counter() - started
+
+    print(f"course stats p50 {_percentile(maintained, 50):.3f} ms  p95 "
+          f"{_percentile(maintained, 95):.3f} ms (maintained) vs p50 "
+          f"{_percentile(scanned, 50):.3f} ms  p95 {_percentile(scanned, 95):.3f} ms (parse roster)")
+    print(f"full recompute of every course {rebuild_s * 1000:.0f} ms")
+    print("OK: incremental statistics match a recompute" if not mismatches
+          else f"FAILED: {len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("enroll", help="concurrent enrollment stress test")
+    p.add_argument("--threads", type=int, default=32)
+    p.add_argument("--students", type=int, default=2000)
+    p.add_argument("--capacity", type=int, default=150)
+    p.add_argument("--waitlist", action="store_true")
+    p.set_defaults(func=bench_enroll)
+
+    p = sub.add_parser("login", help="login throughput, inline vs pooled hashing")
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--logins", type=int, default=200)
+    p.add_argument("--users", type=int, default=50)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument(
+        "--methods",
+        nargs="+",
+        default=["pbkdf2:sha256:100000", "scrypt:16384:8:1", "scrypt:32768:8:1"],
+    )
+    p.set_defaults(func=bench_login)
+
+    p = sub.add_parser("routes", help="latency and query counts for every route")
+    p.add_argument("--students", type=int, default=20_000)
+    p.add_argument("--teachers", type=int, default=200)
+    p.add_argument("--courses", type=int, default=1_000)
+    p.add_argument("--enrollments", type=int, default=200_000)
+    p.add_argument("--iterations", type=int, default=50)
+    p.add_argument("--only", nargs="+", help="route name patterns to run")
+    p.add_argument("--no-seed", action="store_true", help="reuse the database in DATABASE_URL")
+    p.add_argument("--output", default="bench_results.jsonl")
+    p.set_defaults(func=bench_routes)
+
+    p = sub.add_parser("concurrency", help="concurrent reads and writes, rollback journal vs WAL")
+    p.add_argument("--readers", type=int, default=8)
+    p.add_argument("--writers", type=int, default=4)
+    p.add_argument("--seconds", type=float, default=5)
+    p.add_argument("--students", type=int, default=5_000)
+    p.add_argument("--teachers", type=int, default=50)
+    p.add_argument("--courses", type=int, default=200)
+    p.add_argument("--enrollments", type=int, default=50_000)
+    p.set_defaults(func=bench_concurrency)
+
+    p = sub.add_parser("search", help="full-text course search latency")
+    p.add_argument("--courses", type=int, default=100_000)
+    p.add_argument("--students", type=int, default=10_000)
+    p.add_argument("--teachers", type=int, default=2_000)
+    p.add_argument("--enrollments", type=int, default=100_000)
+    p.add_argument("--queries", type=int, default=500)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("sse", help="seat-event subscribers held by one worker")
+    p.add_argument("--subscribers", type=int, default=500)
+    p.add_argument("--bursts", type=int, default=20)
+    p.add_argument("--burst-size", type=int, default=25)
+    p.add_argument("--polls", type=int, default=50)
+    p.add_argument("--students", type=int, default=2_000)
+    p.add_argument("--teachers", type=int, default=20)
+    p.add_argument("--courses", type=int, default=100)
+    p.set_defaults(func=bench_sse)
+
+    p = sub.add_parser("grades", help="incremental grade statistics vs recompute")
+    p.add_argument("--edits", type=int, default=2_000)
+    p.add_argument("--graded", type=float, default=0.8, help="share of enrollments imported with a grade")
+    p.add_argument("--lookups", type=int, default=200)
+    p.add_argument("--students", type=int, default=20_000)
+    p.add_argument("--teachers", type=int, default=200)
+    p.add_argument("--courses", type=int, default=1_000)
+    p.add_argument("--enrollments", type=int, default=200_000)
+    p.set_defaults(func=bench_grades)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Full-text course search backed by an SQLite FTS5 index.
+
+``course_fts`` holds one row per course (rowid = course.id) with the code,
+title and teacher username.  Triggers keep it in sync with every write to
+``course`` and with teacher renames in ``user``, whichever path the write
+takes (admin panel, seed script, raw SQL).  Seat-count updates do not touch
+the indexed columns, so the enrollment hot path never fires them.
+"""
+import re
+
+from sqlalchemy import func, literal_column, select, table, column, text
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import Course
+
+SEARCH_LIMIT = 50
+# Every match is scored, so queries matching more courses than this are
+# refused rather than ranked.  Scoring all 100k courses for "c" or "course"
+# takes ~200 ms; counting up to the cap takes 5-20 ms.
+MAX_RANKED_MATCHES = 5000
+
+course_fts = table("course_fts", column("rowid"), column("teacher"))
+
+
+class SearchTooBroad(Exception):
+    """The query matches more than ``MAX_RANKED_MATCHES`` courses."""
+
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+# Column weights for bm25(): code, title, teacher.
+_RANK = func.bm25(literal_column("course_fts"), 10.0, 5.0, 2.0)
+
+DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS course_fts USING fts5("
+    "code, title, teacher, tokenize = 'unicode61', prefix = '2 3')",
+    """CREATE TRIGGER IF NOT EXISTS course_fts_insert AFTER INSERT ON course BEGIN
+        INSERT INTO course_fts (rowid, code, title, teacher)
+        VALUES (new.id, new.code, new.title,
+                (SELECT username FROM user WHERE user.id = new.teacher_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS course_fts_delete AFTER DELETE ON course BEGIN
+        DELETE FROM course_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS course_fts_update
+    AFTER UPDATE OF code, title, teacher_id ON course BEGIN
+        DELETE FROM course_fts WHERE rowid = old.id;
+        INSERT INTO course_fts (rowid, code, title, teacher)
+        VALUES (new.id, new.code, new.title,
+                (SELECT username FROM user WHERE user.id = new.teacher_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS course_fts_teacher_rename
+    AFTER UPDATE OF username ON user BEGIN
+        UPDATE course_fts SET teacher = new.username
+        WHERE rowid IN (SELECT id FROM course WHERE teacher_id = new.id);
+    END""",
+]
+
+
+def create_index(conn) -> None:
+    """Create the FTS table and triggers, then rebuild the index contents."""
+    for statement in DDL:
+        conn.execute(text(statement))
+    conn.execute(text("DELETE FROM course_fts"))
+    conn.execute(text(
+        "INSERT INTO course_fts (rowid, code, title, teacher) "
+        "SELECT course.id, course.code, course.title, user.username "
+        "FROM course JOIN user ON user.id = course.teacher_id"
+    ))
+
+
+def match_expression(query: str) -> str | None:
+    """Turn user input into an FTS5 query: every word, as a prefix, must match."""
+    terms = _TERM.findall(query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_courses(query: str, limit: int = SEARCH_LIMIT) -> list:
+    """Best-ranked courses for ``query``, teacher and seat counts loaded.
+
+    Raises ``SearchTooBroad`` when there are too many matches to rank.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    matching = literal_column("course_fts").op("MATCH")(expression)
+    capped = select(course_fts.c.rowid).where(matching).limit(MAX_RANKED_MATCHES + 1).subquery()
+    if db.session.scalar(select(func.count()).select_from(capped)) > MAX_RANKED_MATCHES:
+        raise SearchTooBroad()
+    score = _RANK.label("score")
+    matches = select(course_fts.c.rowid, score).where(matching).order_by(score).limit(limit).subquery()
+    return db.session.scalars(
+        select(Course)
+        .join(matches, matches.c.rowid == Course.id)
+        .options(joinedload(Course.teacher))
+        .order_by(matches.c.score)
+    ).all()
@@ -0,0 +1,55 @@
+"""Engine configuration.
+
+SQLite connections are opened in WAL mode by default so readers are not
+blocked by an in-progress enrollment or grade write, with a busy timeout
+that lets concurrent writers queue instead of failing, and
+``synchronous=NORMAL``, which is durable across application crashes in WAL
+mode.  The pool is sized for the threads of one worker process.
+
+* ``SQLITE_JOURNAL_MODE``: ``"wal"`` (default), ``"delete"``, ...
+* ``SQLITE_SYNCHRONOUS``: ``"normal"`` (default), ``"full"``, ``"off"``
+* ``SQLITE_BUSY_TIMEOUT_MS``: how long a writer waits for the lock
+* ``DB_POOL_SIZE`` / ``DB_MAX_OVERFLOW``: connections kept / extra allowed
+"""
+from sqlalchemy import event
+
+
+def configure_engine_options(app) -> None:
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS; call before ``db.init_app``."""
+    config = app.config
+    config.setdefault("SQLITE_JOURNAL_MODE", "wal")
+    config.setdefault("SQLITE_SYNCHRONOUS", "normal")
+    config.setdefault("SQLITE_BUSY_TIMEOUT_MS", 5000)
+    config.setdefault("DB_POOL_SIZE", 8)
+    config.setdefault("DB_MAX_OVERFLOW", 8)
+
+    options = config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    is_sqlite = uri.startswith("sqlite")
+    if is_sqlite and (":memory:" in uri or uri.rstrip("/") == "sqlite:"):
+        return  # Flask-SQLAlchemy uses a StaticPool for in-memory databases.
+    options.setdefault("pool_size", config["DB_POOL_SIZE"])
+    options.setdefault("max_overflow", config["DB_MAX_OVERFLOW"])
+    if is_sqlite:
+        connect_args = options.setdefault("connect_args", {})
+        connect_args.setdefault("timeout", config["SQLITE_BUSY_TIMEOUT_MS"] / 1000)
+
+
+def init_engine(app, db) -> None:
+    """Apply per-connection SQLite settings; call after ``db.init_app``."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # Read at connect time so benchmarks can switch modes after dispose().
+        config = app.config
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        if config["SQLITE_JOURNAL_MODE"]:
+            cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        if config["SQLITE_SYNCHRONOUS"]:
+            cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        cursor.close()
@@ -0,0 +1,218 @@
+"""Seat accounting for course enrollment.
+
+A seat is claimed with a single conditional UPDATE on ``Course.enrolled_count``
+and the enrollment row is inserted in the same transaction, so concurrent
+requests cannot overshoot ``Course.capacity``.  Duplicate enrollments are
+detected by the ``uq_student_course`` constraint rather than a pre-query.
+
+Committed seat-count changes are published to the SSE broadcaster in
+seat_events.py.
+
+The engine writes through Core statements.  Enrollments added, moved or
+deleted through the ORM (for example from the admin panel) keep the counter
+in sync through the mapper events at the bottom of this module.
+"""
+from enum import Enum
+
+from flask import current_app
+from sqlalchemy import select, insert, update, delete, event, inspect
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db, seat_broadcaster
+from models import Course, Enrollment, WaitlistEntry
+import grades
+
+
+class EnrollResult(Enum):
+    ENROLLED = "enrolled"
+    ALREADY_ENROLLED = "already_enrolled"
+    FULL = "full"
+    WAITLISTED = "waitlisted"
+    ALREADY_WAITLISTED = "already_waitlisted"
+    NOT_FOUND = "not_found"
+
+
+def _claim_seat(course_id: int):
+    """Take a seat; returns the new (enrolled_count, capacity) or None."""
+    return db.session.execute(
+        update(Course)
+        .where(Course.id == course_id, Course.enrolled_count < Course.capacity)
+        .values(enrolled_count=Course.enrolled_count + 1)
+        .returning(Course.enrolled_count, Course.capacity)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+
+def _release_seat(course_id: int):
+    return db.session.execute(
+        update(Course)
+        .where(Course.id == course_id, Course.enrolled_count > 0)
+        .values(enrolled_count=Course.enrolled_count - 1)
+        .returning(Course.enrolled_count, Course.capacity)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+
+def publish_seats(course_id: int) -> None:
+    """Publish a course's committed seat count, read back from the database."""
+    seats = db.session.execute(
+        select(Course.enrolled_count, Course.capacity).where(Course.id == course_id)
+    ).first()
+    if seats is not None:
+        seat_broadcaster.publish(course_id, *seats)
+
+
+def enroll(student_id: int, course_id: int, waitlist: bool | None = None) -> EnrollResult:
+    """Enroll a student, joining the waitlist when the course is full.
+
+    The common case is one UPDATE, one INSERT and a commit.  Only a failed
+    seat claim falls back to extra queries to explain why.
+    """
+    if waitlist is None:
+        waitlist = current_app.config.get("ENROLLMENT_WAITLIST", False)
+
+    seats = _claim_seat(course_id)
+    if seats is not None:
+        try:
+            db.session.execute(
+                insert(Enrollment).values(student_id=student_id, course_id=course_id)
+            )
+        except IntegrityError:
+            # Rolling back also gives the claimed seat back.
+            db.session.rollback()
+            return EnrollResult.ALREADY_ENROLLED
+        db.session.commit()
+        seat_broadcaster.publish(course_id, *seats)
+        return EnrollResult.ENROLLED
+
+    if db.session.get(Course, course_id) is None:
+        db.session.rollback()
+        return EnrollResult.NOT_FOUND
+
+    already_enrolled = db.session.execute(
+        select(Enrollment.id).filter_by(student_id=student_id, course_id=course_id)
+    ).first()
+    if already_enrolled:
+        db.session.rollback()
+        return EnrollResult.ALREADY_ENROLLED
+
+    if not waitlist:
+        db.session.rollback()
+        return EnrollResult.FULL
+
+    try:
+        db.session.execute(
+            insert(WaitlistEntry).values(student_id=student_id, course_id=course_id)
+        )
+    except IntegrityError:
+        db.session.rollback()
+        return EnrollResult.ALREADY_WAITLISTED
+    db.session.commit()
+    return EnrollResult.WAITLISTED
+
+
+def drop(student_id: int, course_id: int) -> bool:
+    """Remove an enrollment and hand the freed seat to the waitlist."""
+    deleted = db.session.execute(
+        delete(Enrollment)
+        .filter_by(student_id=student_id, course_id=course_id)
+        .returning(Enrollment.grade_points)
+    ).first()
+    if deleted is None:
+        db.session.rollback()
+        return False
+
+    deltas = {}
+    grades.add_delta(deltas, course_id, deleted.grade_points, -1)
+    grades.apply_deltas(db.session, deltas)
+    seats = _release_seat(course_id)
+    promoted = promote_waitlist(course_id)
+    db.session.commit()
+    if seats is not None:
+        seat_broadcaster.publish(course_id, seats.enrolled_count + promoted, seats.capacity)
+    return True
+
+
+def leave_waitlist(student_id: int, course_id: int) -> bool:
+    deleted = db.session.execute(
+        delete(WaitlistEntry).filter_by(student_id=student_id, course_id=course_id)
+    ).rowcount
+    db.session.commit()
+    return bool(deleted)
+
+
+def promote_waitlist(course_id: int) -> int:
+    """Move waitlisted students into free seats, oldest first.
+
+    Runs inside the caller's transaction; the caller commits.  Returns the
+    number of students promoted.
+    """
+    promoted = 0
+    while True:
+        head = db.session.execute(
+            select(WaitlistEntry.id, WaitlistEntry.student_id)
+            .filter_by(course_id=course_id)
+            .order_by(WaitlistEntry.id)
+            .limit(1)
+        ).first()
+        if head is None:
+            break
+
+        already_enrolled = db.session.execute(
+            select(Enrollment.id).filter_by(student_id=head.student_id, course_id=course_id)
+        ).first()
+        if not already_enrolled:
+            if _claim_seat(course_id) is None:
+                break
+            db.session.execute(
+                insert(Enrollment).values(student_id=head.student_id, course_id=course_id)
+            )
+            promoted += 1
+
+        db.session.execute(delete(WaitlistEntry).where(WaitlistEntry.id == head.id))
+    return promoted
+
+
+def recount_enrollments() -> None:
+    """Rebuild every course's seat counter from the enrollment table."""
+    enrolled = (
+        select(db.func.count(Enrollment.id))
+        .where(Enrollment.course_id == Course.id)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(Course).values(enrolled_count=enrolled).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+# ORM writes (admin panel, scripts) bypass the engine above, so adjust the
+# counter from the flush itself.  Core statements do not trigger these.
+
+def _adjust_count(connection, course_id: int, delta: int) -> None:
+    connection.execute(
+        update(Course)
+        .where(Course.id == course_id)
+        .values(enrolled_count=Course.enrolled_count + delta)
+    )
+
+
+@event.listens_for(Enrollment, "after_insert")
+def _count_orm_insert(mapper, connection, target):
+    _adjust_count(connection, target.course_id, 1)
+
+
+@event.listens_for(Enrollment, "after_delete")
+def _count_orm_delete(mapper, connection, target):
+    _adjust_count(connection, target.course_id, -1)
+
+
+@event.listens_for(Enrollment, "after_update")
+def _count_orm_move(mapper, connection, target):
+    history = inspect(target).attrs.course_id.history
+    if not history.has_changes():
+        return
+    for old_course_id in history.deleted:
+        if old_course_id is not None:
+            _adjust_count(connection, old_course_id, -1)
+    _adjust_count(connection, target.course_id, 1)
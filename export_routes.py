@@ -0,0 +1,42 @@
+from flask import Blueprint, Response, abort, stream_with_context
+from flask_login import login_required, current_user
+
+from decorators import roles_required, owns_course_or_admin
+from exports import FORMATS, stream_rows, roster_query, transcript_query, enrollments_query
+
+export_bp = Blueprint("export", __name__, url_prefix="/export")
+
+
+def _export(stmt, fmt: str, filename: str):
+    if fmt not in FORMATS:
+        abort(404)
+    return Response(
+        stream_with_context(stream_rows(stmt, fmt)),
+        mimetype=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+@export_bp.route("/course/<int:course_id>/roster.<fmt>")
+@login_required
+@roles_required("teacher", "admin")
+def roster(course_id: int, fmt: str):
+    if not owns_course_or_admin(course_id):
+        abort(403)
+    return _export(roster_query(course_id), fmt, f"roster-{course_id}")
+
+
+@export_bp.route("/student/<int:student_id>/transcript.<fmt>")
+@login_required
+@roles_required("student", "admin")
+def transcript(student_id: int, fmt: str):
+    if current_user.role != "admin" and current_user.id != student_id:
+        abort(403)
+    return _export(transcript_query(student_id), fmt, f"transcript-{student_id}")
+
+
+@export_bp.route("/enrollments.<fmt>")
+@login_required
+@roles_required("admin")
+def enrollments(fmt: str):
+    return _export(enrollments_query(), fmt, "enrollments")
@@ -0,0 +1,93 @@
+"""Streaming CSV / NDJSON exports of enrollment data.
+
+Rows come from a single joined Core query read with ``yield_per``, so memory
+stays flat however large the export is, and the header goes out before the
+first chunk is fetched.
+"""
+import csv
+import io
+import json
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import User, Course, Enrollment
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+CHUNK_SIZE = 1000
+
+Teacher = aliased(User, name="teacher")
+
+
+def roster_query(course_id: int):
+    return (
+        select(
+            Course.code.label("course_code"),
+            Enrollment.student_id,
+            User.username,
+            Enrollment.grade,
+        )
+        .join(User, User.id == Enrollment.student_id)
+        .join(Course, Course.id == Enrollment.course_id)
+        .where(Enrollment.course_id == course_id)
+        .order_by(User.username)
+    )
+
+
+def transcript_query(student_id: int):
+    return (
+        select(
+            Course.code.label("course_code"),
+            Course.title.label("course_title"),
+            Teacher.username.label("teacher"),
+            Enrollment.grade,
+        )
+        .join(Course, Course.id == Enrollment.course_id)
+        .join(Teacher, Teacher.id == Course.teacher_id)
+        .where(Enrollment.student_id == student_id)
+        .order_by(Course.code)
+    )
+
+
+def enrollments_query():
+    return (
+        select(
+            Enrollment.id.label("enrollment_id"),
+            Enrollment.student_id,
+            User.username,
+            Enrollment.course_id,
+            Course.code.label("course_code"),
+            Course.title.label("course_title"),
+            Enrollment.grade,
+        )
+        .join(User, User.id == Enrollment.student_id)
+        .join(Course, Course.id == Enrollment.course_id)
+        .order_by(Enrollment.id)
+    )
+
+
+def stream_rows(stmt, fmt: str):
+    """Yield the serialized result of ``stmt`` chunk by chunk."""
+    columns = [c.name for c in stmt.selected_columns]
+    result = db.session.execute(stmt.execution_options(yield_per=CHUNK_SIZE))
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        for chunk in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+    else:
+        for chunk in result.partitions():
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n"
+                for row in chunk
+            )
@@ -1,5 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 
+from identity_cache import IdentityCache
+from passwords import PasswordVerifier
+from sql_profiler import SqlProfiler
+from seat_events import SeatBroadcaster
+
 db = SQLAlchemy()
 login_manager = LoginManager()
+identity_cache = IdentityCache()
+password_verifier = PasswordVerifier()
+sql_profiler = SqlProfiler()
+seat_broadcaster = SeatBroadcaster()
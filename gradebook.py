@@ -0,0 +1,214 @@
+"""Bulk grade import for a course.
+
+Uploads are CSV (``student``/``username`` or ``student_id`` column plus
+``grade``), JSON (an object mapping usernames to grades, or a list of row
+objects) or NDJSON (one row object per line).  CSV and NDJSON are parsed as
+a stream.  Every row is validated against the roster, loaded in one query,
+and the valid ones are written with a single executemany UPDATE in one
+transaction, together with their grade points and the course statistics
+(see grades.py).  Bad rows are reported and skipped; a file that cannot be
+read at all (not UTF-8, malformed CSV, no grade column) changes nothing.
+A grade is only cleared by a row that has the grade field, left empty.
+"""
+import codecs
+import csv
+import json
+
+from sqlalchemy import select, update
+
+from extensions import db
+import grades
+from models import Enrollment, User
+
+GRADE_MAX_LENGTH = Enrollment.grade.type.length
+FILE_ERROR = 0  # row number reported for problems with the file as a whole
+STUDENT_FIELDS = ("student", "username", "student_id")
+
+
+class ImportResult:
+    def __init__(self):
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []  # (row number, message)
+
+    def error(self, row: int, message: str) -> None:
+        self.errors.append((row, message))
+
+
+def _upload_format(file_storage) -> str:
+    name = (file_storage.filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".json") or file_storage.mimetype == "application/json":
+        return "json"
+    return "csv"
+
+
+def _text_lines(stream):
+    return codecs.getreader("utf-8-sig")(stream)
+
+
+def _row_key(row: dict):
+    for field in ("student", "username"):
+        if row.get(field) not in (None, ""):
+            return str(row[field]).strip()
+    if row.get("student_id") not in (None, ""):
+        try:
+            return int(row["student_id"])
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+_MISSING = object()
+
+
+def _parse_row(number: int, row: dict):
+    if row.get("grade", _MISSING) is _MISSING:
+        return number, None, None, "missing grade"
+    return number, _row_key(row), row["grade"], None
+
+
+def parse_upload(file_storage):
+    """Yield ``(row number, student key, grade, error)`` tuples.
+
+    The key is a username (str) or student id (int).  ``error`` is set, and
+    the other fields may be ``None``, when the row itself is malformed; row
+    ``FILE_ERROR`` means the file as a whole could not be read.
+    """
+    fmt = _upload_format(file_storage)
+    try:
+        if fmt == "csv":
+            yield from _parse_csv(file_storage.stream)
+        elif fmt == "ndjson":
+            yield from _parse_ndjson(file_storage.stream)
+        else:
+            yield from _parse_json(file_storage.stream)
+    except UnicodeDecodeError:
+        yield FILE_ERROR, None, None, "the file is not UTF-8 text"
+    except csv.Error as exc:
+        yield FILE_ERROR, None, None, f"invalid CSV: {exc}"
+
+
+def _parse_csv(stream):
+    reader = csv.DictReader(_text_lines(stream))
+    fields = reader.fieldnames or []
+    if "grade" not in fields or not any(f in fields for f in STUDENT_FIELDS):
+        yield FILE_ERROR, None, None, "the CSV header needs a student (or username, student_id) and a grade column"
+        return
+    for number, row in enumerate(reader, start=2):  # line 1 is the header
+        # A short row leaves its missing fields as None.
+        if row.get("grade") is None:
+            row.pop("grade", None)
+        yield _parse_row(number, row)
+
+
+def _parse_ndjson(stream):
+    for number, line in enumerate(_text_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, None, None, f"invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, None, "expected an object"
+            continue
+        yield _parse_row(number, row)
+
+
+def _parse_json(stream):
+
+    try:
+        data = json.load(_text_lines(stream))
+    except UnicodeDecodeError:
+        raise  # a ValueError too; reported by parse_upload
+    except ValueError as exc:
+        yield FILE_ERROR, None, None, f"invalid JSON: {exc}"
+        return
+    if isinstance(data, dict):
+        for number, (username, grade) in enumerate(data.items(), start=1):
+            yield number, username.strip(), grade, None
+    elif isinstance(data, list):
+        for number, row in enumerate(data, start=1):
+            if not isinstance(row, dict):
+                yield number, None, None, "expected an object"
+                continue
+            yield _parse_row(number, row)
+    else:
+        yield FILE_ERROR, None, None, "expected an object or a list of rows"
+
+
+def import_grades(course_id: int, rows) -> ImportResult:
+    """Apply parsed rows to the course roster in one transaction.
+
+    Nothing is written when the rows include a ``FILE_ERROR``.
+    """
+    result = ImportResult()
+
+    roster = db.session.execute(
+        select(
+            Enrollment.id, Enrollment.student_id, User.username,
+            Enrollment.grade, Enrollment.grade_points,
+        )
+        .join(User, User.id == Enrollment.student_id)
+        .where(Enrollment.course_id == course_id)
+    ).all()
+    by_id = {r.student_id: r for r in roster}
+    by_username = {r.username: r for r in roster}
+
+    changes = {}  # enrollment id -> (new grade, new points)
+    deltas = {}  # course statistics adjustments, see grades.add_delta
+    seen = {}  # enrollment id -> row number
+    unreadable = False
+    for number, key, grade, error in rows:
+        if error:
+            result.error(number, error)
+            unreadable = unreadable or number == FILE_ERROR
+            continue
+        if key is None:
+            result.error(number, "missing student")
+            continue
+        entry = by_id.get(key) if isinstance(key, int) else by_username.get(key)
+        if entry is None:
+            result.error(number, f"{key} is not enrolled in this course")
+            continue
+        if entry.id in seen:
+            result.error(number, f"{entry.username} already appears on row {seen[entry.id]}")
+            continue
+        seen[entry.id] = number
+
+        if grade is None:
+            grade = ""
+        elif isinstance(grade, (str, int, float)) and not isinstance(grade, bool):
+            grade = str(grade).strip()
+        else:
+            result.error(number, "grade must be text or a number")
+            continue
+        if len(grade) > GRADE_MAX_LENGTH:
+            result.error(number, f"grade {grade!r} is longer than {GRADE_MAX_LENGTH} characters")
+            continue
+        grade = grade or None
+        if grade == entry.grade:
+            result.unchanged += 1
+            continue
+        points = grades.grade_points(grade)
+        changes[entry.id] = (grade, points)
+        grades.add_delta(deltas, course_id, entry.grade_points, -1)
+        grades.add_delta(deltas, course_id, points, 1)
+
+    if unreadable:
+        changes.clear()
+    if changes:
+        db.session.execute(
+            update(Enrollment),
+            [
+                {"id": enrollment_id, "grade": grade, "grade_points": points}
+                for enrollment_id, (grade, points) in changes.items()
+            ],
+        )
+        grades.apply_deltas(db.session, deltas)
+        db.session.commit()
+    result.updated = len(changes)
+    return result
@@ -0,0 +1,313 @@
+"""Normalized grade points and maintained per-course grade statistics.
+
+``Enrollment.grade`` keeps the text the teacher entered.  Next to it,
+``Enrollment.grade_points`` holds that grade on the configured scale:
+letters map through ``GRADE_SCALE`` and percentages ("95", "88.5%")
+through ``GRADE_PERCENT_CUTOFFS``.  Grades without a point value ("P", "W",
+"I") store NULL and are left out of averages.
+
+``CourseGradeBucket`` holds, for each course and histogram bucket, the
+number of graded enrollments and the sum of their points, so a course's
+average and distribution come from at most a handful of rows.  Every grade
+write adjusts it in the same transaction: ORM writes (the grade form, the
+admin panel) through the mapper events at the bottom of this module, Core
+writes (grade import, drop) by calling ``apply_deltas`` themselves.
+
+``rebuild_grade_stats`` recomputes the table from scratch and
+``verify_grade_stats`` compares the maintained values with a recompute.
+After changing the scale, run ``python grades.py`` to re-derive the points.
+"""
+import argparse
+import math
+import sys
+
+from flask import current_app
+from sqlalchemy import case, delete, event, func, insert, inspect, select, update, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import CourseGradeBucket, Enrollment
+
+# Keys are upper case; lookups are case-insensitive.
+DEFAULT_GRADE_SCALE = {
+    "A+": 4.0, "A": 4.0, "A-": 3.7,
+    "B+": 3.3, "B": 3.0, "B-": 2.7,
+    "C+": 2.3, "C": 2.0, "C-": 1.7,
+    "D+": 1.3, "D": 1.0, "D-": 0.7,
+    "F": 0.0,
+}
+# (minimum percentage, letter), highest first.
+DEFAULT_PERCENT_CUTOFFS = [
+    (97, "A+"), (93, "A"), (90, "A-"),
+    (87, "B+"), (83, "B"), (80, "B-"),
+    (77, "C+"), (73, "C"), (70, "C-"),
+    (67, "D+"), (63, "D"), (60, "D-"),
+    (0, "F"),
+]
+# (bucket, minimum points), highest first; the last bucket takes the rest.
+DEFAULT_GRADE_BUCKETS = [("A", 3.5), ("B", 2.5), ("C", 1.5), ("D", 0.5), ("F", 0.0)]
+
+# Running sums are rounded so adding and removing the same grades returns
+# exactly to the recomputed value instead of drifting.
+SUM_DIGITS = 6
+BATCH_SIZE = 5000
+
+
+def _config(key, default):
+    return current_app.config.get(key, default)
+
+
+def grade_points(grade: str | None) -> float | None:
+    """Points for a grade string, or None when it has no point value."""
+    if grade is None:
+        return None
+    text = grade.strip().upper()
+    if not text:
+        return None
+    scale = _config("GRADE_SCALE", DEFAULT_GRADE_SCALE)
+    if text in scale:
+        return float(scale[text])
+    try:
+        percent = float(text.removesuffix("%"))
+    except ValueError:
+        return None
+    if not (math.isfinite(percent) and 0 <= percent <= 100):
+        return None
+    for cutoff, letter in _config("GRADE_PERCENT_CUTOFFS", DEFAULT_PERCENT_CUTOFFS):
+        if percent >= cutoff:
+            return float(scale[letter])
+    return None
+
+
+def bucket_for(points: float) -> str:
+    buckets = _config("GRADE_BUCKETS", DEFAULT_GRADE_BUCKETS)
+    for name, minimum in buckets[:-1]:
+        if points >= minimum:
+            return name
+    return buckets[-1][0]
+
+
+def _bucket_expression():
+    """SQL twin of ``bucket_for`` over ``Enrollment.grade_points``."""
+    buckets = _config("GRADE_BUCKETS", DEFAULT_GRADE_BUCKETS)
+    return case(
+        *[(Enrollment.grade_points >= minimum, name) for name, minimum in buckets[:-1]],
+        else_=buckets[-1][0],
+    )
+
+
+# -- incremental maintenance --------------------------------------------------
+
+def add_delta(deltas: dict, course_id: int, points: float | None, sign: int) -> None:
+    """Record that a grade worth ``points`` joins (+1) or leaves (-1) a course."""
+    if points is None:
+        return
+    entry = deltas.setdefault((course_id, bucket_for(points)), [0, 0.0])
+    entry[0] += sign
+    entry[1] += sign * points
+
+
+def apply_deltas(connection, deltas: dict) -> None:
+    """Add collected deltas to ``CourseGradeBucket`` with one executemany upsert.
+
+    ``connection`` is the session or, inside flush events, the connection.
+    """
+    rows = [
+        {"course_id": course_id, "bucket": bucket, "count": count,
+         "points_sum": round(points, SUM_DIGITS)}
+        for (course_id, bucket), (count, points) in deltas.items()
+        if count or points
+    ]
+    if not rows:
+        return
+    table = CourseGradeBucket.__table__
+    stmt = sqlite_insert(table)
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.course_id, table.c.bucket],
+            set_={
+                "count": table.c.count + stmt.excluded.count,
+                "points_sum": func.round(table.c.points_sum + stmt.excluded.points_sum, SUM_DIGITS),
+            },
+        ),
+        rows,
+    )
+
+
+# -- reads --------------------------------------------------------------------
+
+class CourseGradeStats:
+    def __init__(self, histogram: dict, count: int, points_sum: float):
+        self.histogram = histogram  # bucket -> count, in bucket order
+        self.count = count
+        self.points_sum = points_sum
+
+    @property
+    def mean(self) -> float | None:
+        return self.points_sum / self.count if self.count else None
+
+
+def course_stats(course_id: int) -> CourseGradeStats:
+    """Grade count, average and histogram for a course from the maintained rows."""
+    rows = db.session.execute(
+        select(CourseGradeBucket.bucket, CourseGradeBucket.count, CourseGradeBucket.points_sum)
+        .where(CourseGradeBucket.course_id == course_id)
+    ).all()
+    histogram = {name: 0 for name, _ in _config("GRADE_BUCKETS", DEFAULT_GRADE_BUCKETS)}
+    for row in rows:
+        histogram[row.bucket] = row.count
+    return CourseGradeStats(
+        histogram, sum(r.count for r in rows), sum(r.points_sum for r in rows)
+    )
+
+
+def gpa(enrollments) -> float | None:
+    """Mean grade points over already-loaded enrollments; None if none count."""
+    points = [e.grade_points for e in enrollments if e.grade_points is not None]
+    return sum(points) / len(points) if points else None
+
+
+# -- recompute ----------------------------------------------------------------
+
+def _recomputed_rows():
+    return (
+        select(
+            Enrollment.course_id,
+            _bucket_expression().label("bucket"),
+            func.count().label("count"),
+            func.round(func.sum(Enrollment.grade_points), SUM_DIGITS).label("points_sum"),
+        )
+        .where(Enrollment.grade_points.is_not(None))
+        .group_by(Enrollment.course_id, "bucket")
+    )
+
+
+def renormalize_grade_points(connection) -> int:
+    """Re-derive every ``grade_points`` from its grade; returns rows changed."""
+    table = Enrollment.__table__
+    set_points = (
+        update(table)
+        .where(table.c.id == bindparam("_id"))
+        .values(grade_points=bindparam("_points"))
+    )
+    changed = 0
+    last_id = 0
+    while True:
+        batch = connection.execute(
+            select(table.c.id, table.c.grade, table.c.grade_points)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not batch:
+            return changed
+        last_id = batch[-1].id
+        params = []
+        for row in batch:
+            points = grade_points(row.grade)
+            if points != row.grade_points:
+                params.append({"_id": row.id, "_points": points})
+        if params:
+            connection.execute(set_points, params)
+            changed += len(params)
+
+
+def rebuild_grade_stats(connection) -> None:
+    """Recompute ``CourseGradeBucket`` from the enrollment table."""
+    connection.execute(delete(CourseGradeBucket))
+    connection.execute(
+        insert(CourseGradeBucket).from_select(
+            ["course_id", "bucket", "count", "points_sum"], _recomputed_rows()
+        )
+    )
+
+
+def verify_grade_stats() -> list:
+    """Differences between the maintained table and a recompute, if any.
+
+    Returns ``(course_id, bucket, maintained, expected)`` tuples, each value a
+    ``(count, points_sum)`` pair.
+    """
+    expected = {
+        (r.course_id, r.bucket): (r.count, r.points_sum)
+        for r in db.session.execute(_recomputed_rows())
+    }
+    maintained = {
+        (r.course_id, r.bucket): (r.count, r.points_sum)
+        for r in db.session.execute(select(CourseGradeBucket)).scalars()
+        if r.count or r.points_sum
+    }
+    mismatches = []
+    for key in sorted(expected.keys() | maintained.keys()):
+        want = expected.get(key, (0, 0.0))
+        have = maintained.get(key, (0, 0.0))
+        if have[0] != want[0] or not math.isclose(have[1], want[1], abs_tol=10 ** -SUM_DIGITS):
+            mismatches.append((*key, have, want))
+    return mismatches
+
+
+# ORM writes (the grade form, admin panel) derive the points and adjust the
+# statistics from the flush itself.  Core statements do not trigger these.
+
+@event.listens_for(Enrollment, "before_insert")
+def _points_on_insert(mapper, connection, target):
+    target.grade_points = grade_points(target.grade)
+
+
+@event.listens_for(Enrollment, "before_update")
+def _points_on_update(mapper, connection, target):
+    if inspect(target).attrs.grade.history.has_changes():
+        target.grade_points = grade_points(target.grade)
+
+
+@event.listens_for(Enrollment, "after_insert")
+def _stats_orm_insert(mapper, connection, target):
+    deltas = {}
+    add_delta(deltas, target.course_id, target.grade_points, 1)
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(Enrollment, "after_delete")
+def _stats_orm_delete(mapper, connection, target):
+    deltas = {}
+    add_delta(deltas, target.course_id, target.grade_points, -1)
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(Enrollment, "after_update")
+def _stats_orm_update(mapper, connection, target):
+    attrs = inspect(target).attrs
+    course_history = attrs.course_id.history
+    points_history = attrs.grade_points.history
+    if not (course_history.has_changes() or points_history.has_changes()):
+        return
+    old_course_id = course_history.deleted[0] if course_history.deleted else target.course_id
+    old_points = points_history.deleted[0] if points_history.deleted else target.grade_points
+    deltas = {}
+    add_delta(deltas, old_course_id, old_points, -1)
+    add_delta(deltas, target.course_id, target.grade_points, 1)
+    apply_deltas(connection, deltas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild or check grade points and statistics.")
+    parser.add_argument("--verify", action="store_true", help="only compare with a recompute")
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    with app.app_context():
+        if not args.verify:
+            with db.engine.begin() as conn:
+                changed = renormalize_grade_points(conn)
+                rebuild_grade_stats(conn)
+            print(f"Re-derived {changed} grade points; rebuilt course statistics.")
+        mismatches = verify_grade_stats()
+    for course_id, bucket, have, want in mismatches[:20]:
+        print(f"course {course_id} bucket {bucket}: maintained {have}, recomputed {want}")
+    print(f"{len(mismatches)} mismatches." if mismatches else "Course statistics match a recompute.")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Per-process cache of the identities Flask-Login loads on every request.
+
+Entries are small detached records (id, username, role) rather than ORM
+instances, so they are cheap to keep and safe to share between requests.
+Entries expire after a TTL and the least recently used ones are evicted
+once the cache is full.  Edits made through the admin panel invalidate the
+affected entry; other processes pick the change up when the TTL runs out.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+
+class CachedUser(UserMixin):
+    def __init__(self, id: int, username: str, role: str):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def __repr__(self):
+        return f"<CachedUser {self.id} {self.username!r} ({self.role})>"
+
+
+class IdentityCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, CachedUser)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app) -> None:
+        self.maxsize = app.config.setdefault("IDENTITY_CACHE_SIZE", self.maxsize)
+        self.ttl = app.config.setdefault("IDENTITY_CACHE_TTL", self.ttl)
+
+    def get(self, user_id: int) -> CachedUser | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user: CachedUser) -> CachedUser:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return user
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return user
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
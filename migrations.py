@@ -0,0 +1,126 @@
+"""Versioned schema migrations.
+
+The schema version lives in SQLite's ``PRAGMA user_version``.  ``upgrade``
+creates a fresh database from the models, or brings an existing one up to
+date by running every step newer than its version, so ``school.db`` keeps
+its data across releases.  Steps check before they change anything, which
+keeps them safe to re-run on a database that is partly up to date.
+
+    python migrations.py        # upgrade the configured database in place
+"""
+from sqlalchemy import inspect, text
+
+from extensions import db
+from models import User, Course, Enrollment, WaitlistEntry, CourseGradeBucket
+import course_search
+import grades
+
+MIGRATIONS = []  # (version, description, step), in version order
+
+
+def migration(version: int, description: str):
+    def register(step):
+        MIGRATIONS.append((version, description, step))
+        return step
+
+    return register
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+@migration(1, "Course.enrolled_count seat counter and waitlist table")
+def _seat_counter(conn):
+    if not _has_column(conn, "course", "enrolled_count"):
+        conn.execute(text(
+            "ALTER TABLE course ADD COLUMN enrolled_count INTEGER NOT NULL DEFAULT 0"
+        ))
+        conn.execute(text(
+            "UPDATE course SET enrolled_count = "
+            "(SELECT count(*) FROM enrollment WHERE enrollment.course_id = course.id)"
+        ))
+    WaitlistEntry.__table__.create(conn, checkfirst=True)
+
+
+@migration(2, "Course.updated_at")
+def _course_updated_at(conn):
+    if not _has_column(conn, "course", "updated_at"):
+        # SQLite cannot add a column with a non-constant default; new rows
+        # get their value from the model.
+        conn.execute(text("ALTER TABLE course ADD COLUMN updated_at DATETIME"))
+    conn.execute(text(
+        "UPDATE course SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"
+    ))
+
+
+@migration(3, "Indexes on enrollment.course_id, course.teacher_id and the waitlist")
+def _lookup_indexes(conn):
+    for model in (Course, Enrollment, WaitlistEntry):
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+    conn.execute(text("ANALYZE"))
+
+
+@migration(4, "FTS5 course search index and sync triggers")
+def _course_search_index(conn):
+    course_search.create_index(conn)
+
+
+@migration(5, "Enrollment.grade_points and per-course grade statistics")
+def _grade_points(conn):
+    if not _has_column(conn, "enrollment", "grade_points"):
+        conn.execute(text("ALTER TABLE enrollment ADD COLUMN grade_points FLOAT"))
+    CourseGradeBucket.__table__.create(conn, checkfirst=True)
+    grades.renormalize_grade_points(conn)
+    grades.rebuild_grade_stats(conn)
+
+
+@migration(6, "Case-insensitive indexes on user.username and course.code")
+def _nocase_search_indexes(conn):
+    for model in (User, Course):
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+    conn.execute(text("ANALYZE"))
+
+
+def head() -> int:
+    return MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def upgrade() -> list:
+    """Bring the app's database up to ``head()``; returns the steps applied."""
+    applied = []
+    with db.engine.begin() as conn:
+        if not inspect(conn).has_table("user"):
+            db.metadata.create_all(conn)
+            version = 0
+        else:
+            version = current_version(conn)
+        for step_version, description, step in MIGRATIONS:
+            if step_version <= version:
+                continue
+            step(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {int(step_version)}")
+            applied.append((step_version, description))
+    return applied
+
+
+def main():
+    from app import app
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            before = current_version(conn)
+        applied = upgrade()
+    for version, description in applied:
+        print(f"Applied {version}: {description}")
+    print(f"Schema version {before} -> {head()}." if applied else f"Schema is up to date ({head()}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 
-from extensions import db
+from extensions import db, password_verifier
+from passwords import hash_password
 
 from flask_login import UserMixin
 
@@ -12,11 +12,16 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # "student", "teacher", "admin"
 
+    __table_args__ = (
+        # Case-insensitive prefix search in the admin panel.
+        Index("ix_user_username_nocase", username.collate("NOCASE")),
+    )
+
     def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        return password_verifier.verify(self.password_hash, password)
 
 
 class Course(db.Model):
@@ -24,22 +29,73 @@ class Course(db.Model):
     code = db.Column(db.String(20), unique=True, nullable=False)
     title = db.Column(db.String(120), nullable=False)
     capacity = db.Column(db.Integer, nullable=False, default=30)
+    # Maintained seat counter; see enrollment.py for how it is kept in sync.
+    enrolled_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Bumped on every write, including the engine's Core UPDATEs.
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=db.func.now(),
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+    )
 
     teacher_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     teacher = db.relationship("User", foreign_keys=[teacher_id])
 
+    __table_args__ = (
+        # Teacher dashboard and ownership checks, already in code order.
+        Index("ix_course_teacher_code", "teacher_id", "code"),
+        Index("ix_course_code_nocase", code.collate("NOCASE")),
+    )
+
 
 class Enrollment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
     student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
+    # active_history loads the old value when an expired instance is moved,
+    # so the seat counters can always debit the course it left.
+    course_id = db.mapped_column(
+        db.Integer, db.ForeignKey("course.id"), nullable=False, active_history=True
+    )
 
-    grade = db.Column(db.String(5))
+    grade = db.mapped_column(db.String(5), active_history=True)
+    # ``grade`` on the configured scale, NULL when it has no point value;
+    # maintained by grades.py, which needs the old value to update the
+    # course statistics.
+    grade_points = db.mapped_column(db.Float, active_history=True)
 
     student = db.relationship("User", foreign_keys=[student_id])
     course = db.relationship("Course", foreign_keys=[course_id])
 
     __table_args__ = (
         UniqueConstraint("student_id", "course_id", name="uq_student_course"),
+        # The unique constraint leads with student_id; rosters and seat counts
+        # look enrollments up by course.
+        Index("ix_enrollment_course_student", "course_id", "student_id"),
+    )
+
+
+class CourseGradeBucket(db.Model):
+    # Per-course grade histogram with running totals; see grades.py.
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), primary_key=True)
+    bucket = db.Column(db.String(2), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    points_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class WaitlistEntry(db.Model):
+    # FIFO order is the insertion order of the primary key.
+    id = db.Column(db.Integer, primary_key=True)
+
+    student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
+
+    student = db.relationship("User", foreign_keys=[student_id])
+    course = db.relationship("Course", foreign_keys=[course_id])
+
+    __table_args__ = (
+        UniqueConstraint("student_id", "course_id", name="uq_waitlist_student_course"),
+        Index("ix_waitlist_course_order", "course_id", "id"),
     )
@@ -0,0 +1,127 @@
+"""Password hashing with a configurable cost.
+
+``PASSWORD_HASH_METHOD`` picks the werkzeug method string used for new
+hashes (e.g. ``"scrypt:32768:8:1"`` or ``"pbkdf2:sha256:600000"``).  Stored
+hashes made with different parameters are reported by ``needs_rehash`` so
+the login view can upgrade them.
+
+Verification can run in a bounded process pool so a login storm spreads
+over every core and request threads only wait on the result:
+
+* ``PASSWORD_POOL_WORKERS``: pool size, ``0`` verifies on the request thread.
+* ``PASSWORD_POOL_MAX_PENDING``: verifications queued or running at once;
+  further callers wait for a slot.  A slot is held until its job finishes,
+  even when the caller has already given up waiting for it.
+* ``PASSWORD_POOL_TIMEOUT``: seconds to wait for a slot and for the result.
+
+If a worker dies the pool is replaced and the verification retried once.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_HASH_METHOD = "scrypt:32768:8:1"
+
+
+class PasswordPoolBusy(Exception):
+    """No verification slot or result became available within the timeout."""
+
+
+def _hash_method() -> str:
+    if has_app_context():
+        return current_app.config.get("PASSWORD_HASH_METHOD", DEFAULT_HASH_METHOD)
+    return DEFAULT_HASH_METHOD
+
+
+@lru_cache(maxsize=None)
+def _canonical_method(method: str) -> str:
+    # werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"); hashing an
+    # empty password once tells us the prefix it would store.
+    return generate_password_hash("", method=method, salt_length=1).split("$", 1)[0]
+
+
+def hash_password(password: str) -> str:
+    return generate_password_hash(password, method=_hash_method())
+
+
+def needs_rehash(pwhash: str) -> bool:
+    return pwhash.split("$", 1)[0] != _canonical_method(_hash_method())
+
+
+class PasswordVerifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+
+    def init_app(self, app) -> None:
+        app.config.setdefault("PASSWORD_HASH_METHOD", DEFAULT_HASH_METHOD)
+        app.config.setdefault("PASSWORD_POOL_WORKERS", os.cpu_count() or 1)
+        app.config.setdefault("PASSWORD_POOL_MAX_PENDING", 4 * app.config["PASSWORD_POOL_WORKERS"])
+        app.config.setdefault("PASSWORD_POOL_TIMEOUT", 10)
+
+    def _pool(self, config):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: request threads may hold locks at fork time.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=config["PASSWORD_POOL_WORKERS"],
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._slots = threading.BoundedSemaphore(
+                    max(config["PASSWORD_POOL_MAX_PENDING"], 1)
+                )
+            return self._executor, self._slots
+
+    def _discard(self, executor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self._slots = None
+
+    def _verify_in_pool(self, executor, slots, config, pwhash: str, password: str) -> bool:
+        timeout = config["PASSWORD_POOL_TIMEOUT"]
+        if not slots.acquire(timeout=timeout):
+            raise PasswordPoolBusy()
+        try:
+            future = executor.submit(check_password_hash, pwhash, password)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot is freed when the job ends, not when this caller gives up.
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordPoolBusy() from None
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        if not has_app_context() or not current_app.config.get("PASSWORD_POOL_WORKERS"):
+            return check_password_hash(pwhash, password)
+
+        config = current_app.config
+        for _ in range(2):
+            executor, slots = self._pool(config)
+            try:
+                return self._verify_in_pool(executor, slots, config, pwhash, password)
+            except BrokenProcessPool:
+                # A worker died (OOM kill, crash); retry once on a fresh pool.
+                self._discard(executor)
+        return check_password_hash(pwhash, password)
+
+    def shutdown(self) -> None:
+        """Stop the pool; the next verification starts a fresh one."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+            self._slots = None
@@ -0,0 +1,110 @@
+"""In-process broadcaster of seat-count changes for Server-Sent Events.
+
+Writers call ``publish`` after committing a change to a course's seat
+count.  A background thread wakes every ``SEAT_EVENTS_INTERVAL`` seconds
+and hands whatever changed since the last tick to every subscriber, so a
+burst of enrollments in one course becomes a single message carrying the
+latest count.  Each subscriber coalesces undelivered updates by course, so
+a slow client costs at most one entry per course, never a growing queue.
+
+Only clients connected to the same process see its updates; with several
+workers each worker broadcasts the writes it served.
+"""
+import json
+import threading
+import time
+
+
+class Subscription:
+    def __init__(self, course_ids=None):
+        self.course_ids = set(course_ids) if course_ids else None
+        self._pending = {}
+        self._ready = threading.Condition()
+
+    def deliver(self, batch: dict) -> None:
+        if self.course_ids is not None:
+            batch = {cid: seats for cid, seats in batch.items() if cid in self.course_ids}
+        if not batch:
+            return
+        with self._ready:
+            self._pending.update(batch)
+            self._ready.notify()
+
+    def wait(self, timeout: float) -> dict:
+        """Block until updates arrive or ``timeout`` passes; return them."""
+        with self._ready:
+            if not self._pending:
+                self._ready.wait(timeout)
+            batch, self._pending = self._pending, {}
+        return batch
+
+
+class SeatBroadcaster:
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}  # course_id -> (enrolled, capacity)
+        self._subscribers = set()
+        self._thread = None
+        self.published = 0
+        self.batches = 0
+
+    def init_app(self, app) -> None:
+        self.interval = app.config.setdefault("SEAT_EVENTS_INTERVAL", self.interval)
+        app.config.setdefault("SEAT_EVENTS_HEARTBEAT", 15)
+
+    def publish(self, course_id: int, enrolled: int, capacity: int) -> None:
+        with self._lock:
+            if not self._subscribers:
+                return
+            self._pending[course_id] = (enrolled, capacity)
+            self.published += 1
+
+    def subscribe(self, course_ids=None) -> Subscription:
+        subscription = Subscription(course_ids)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="seat-broadcaster", daemon=True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._pending:
+                    continue
+                batch, self._pending = self._pending, {}
+                subscribers = list(self._subscribers)
+                self.batches += 1
+            for subscription in subscribers:
+                subscription.deliver(batch)
+
+    def stream(self, subscription: Subscription, heartbeat: float):
+        """Server-Sent Events body for one subscriber."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                batch = subscription.wait(heartbeat)
+                if not batch:
+                    yield ": keep-alive\n\n"
+                    continue
+                data = [
+                    {"id": cid, "enrolled": enrolled, "capacity": capacity}
+                    for cid, (enrolled, capacity) in batch.items()
+                ]
+                yield f"event: seats\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+        finally:
+            self.unsubscribe(subscription)
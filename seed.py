@@ -1,12 +1,20 @@
+import argparse
+import random
+import time
+
 from extensions import db
 from app import app
-from models import User, Course
+from models import User, Course, Enrollment
+from passwords import hash_password
+from migrations import upgrade
+
+BATCH_SIZE = 20_000
 
 
 def seed():
     with app.app_context():
         db.drop_all()
-        db.create_all()
+        upgrade()
 
         admin = User(username="admin", role="admin")
         admin.set_password("admin")
@@ -42,5 +50,98 @@ def seed():
         print("Students: alice, bob, charlie / student")
 
 
+def _insert_batches(table, rows) -> int:
+    """Insert an iterable of row dicts with executemany, BATCH_SIZE at a time."""
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        total += len(batch)
+    return total
+
+
+def seed_scale(students: int, teachers: int, courses: int, enrollments: int, rng_seed: int = 0):
+    """Generate a large synthetic school with bulk Core inserts.
+
+    Every account of a role shares one precomputed password hash, so the
+    hashing cost is paid three times instead of once per user.
+    """
+    rng = random.Random(rng_seed)
+    started = time.perf_counter()
+
+    with app.app_context():
+        db.drop_all()
+        upgrade()
+
+        hashes = {role: hash_password(role) for role in ("admin", "teacher", "student")}
+        users = User.__table__
+        _insert_batches(users, [{"username": "admin", "password_hash": hashes["admin"], "role": "admin"}])
+        _insert_batches(users, (
+            {"username": f"teacher{i:05d}", "password_hash": hashes["teacher"], "role": "teacher"}
+            for i in range(teachers)
+        ))
+        _insert_batches(users, (
+            {"username": f"student{i:06d}", "password_hash": hashes["student"], "role": "student"}
+            for i in range(students)
+        ))
+        # Ids are assigned in insertion order on a fresh database.
+        teacher_ids = range(2, 2 + teachers)
+        student_ids = range(2 + teachers, 2 + teachers + students)
+
+        # Split the enrollments over the courses with some popular outliers,
+        # never more than there are students.
+        weights = [rng.paretovariate(1.5) for _ in range(courses)]
+        scale = enrollments / sum(weights) if weights else 0
+        sizes = [min(students, int(w * scale)) for w in weights]
+        for i in rng.sample(range(courses), min(courses, max(enrollments - sum(sizes), 0))):
+            sizes[i] = min(students, sizes[i] + 1)
+
+        _insert_batches(Course.__table__, (
+            {
+                "code": f"C{i:06d}",
+                "title": f"Course {i}",
+                "capacity": max(size, rng.randint(20, 400)),
+                "enrolled_count": size,
+                "teacher_id": teacher_ids[i % teachers],
+            }
+            for i, size in enumerate(sizes)
+        ))
+
+        def enrollment_rows():
+            for course_id, size in enumerate(sizes, start=1):
+                for student_id in rng.sample(student_ids, size):
+                    yield {"student_id": student_id, "course_id": course_id}
+
+        total = _insert_batches(Enrollment.__table__, enrollment_rows())
+        db.session.commit()
+
+    print(f"Seeded {students} students, {teachers} teachers, {courses} courses, "
+          f"{total} enrollments in {time.perf_counter() - started:.1f}s.")
+    print("Admin: admin / admin")
+    print("Teachers: teacher00000.. / teacher, students: student000000.. / student")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reset the database with demo or synthetic data.")
+    parser.add_argument("--scale", action="store_true", help="generate a large synthetic data set")
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--teachers", type=int, default=1_000)
+    parser.add_argument("--courses", type=int, default=5_000)
+    parser.add_argument("--enrollments", type=int, default=2_000_000)
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args(argv)
+
+    if args.scale:
+        seed_scale(args.students, args.teachers, args.courses, args.enrollments, args.seed)
+    else:
+        seed()
+
+
 if __name__ == "__main__":
-    seed()
+    main()
@@ -0,0 +1,148 @@
+"""Per-request SQL instrumentation.
+
+Every statement run on the app's engine during a request is timed.  At the
+end of the request the profile is folded into per-endpoint totals (query
+count, DB time, slowest statements), and statements repeated with the same
+shape at least ``SQL_N_PLUS_ONE_THRESHOLD`` times are flagged as probable
+N+1 loads.
+
+``SQL_PROFILER_HEADERS`` (default: follow ``app.debug``) adds a
+``Server-Timing`` header to each response.  Statements run while a streamed
+response body is generated finish after the request and are not counted.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, has_request_context, current_app
+from sqlalchemy import event
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Collapse whitespace, literals and expanded IN lists."""
+    shape = _SPACE.sub(" ", statement).strip()
+    shape = _IN_LIST.sub("(?, ...)", shape)
+    return _NUMBER.sub("?", shape)
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.max_queries = 0
+        self.slowest = []  # (seconds, statement), slowest first
+        self.n_plus_one = Counter()  # shape -> requests it was flagged in
+
+    @property
+    def avg_queries(self) -> float:
+        return self.queries / self.requests if self.requests else 0.0
+
+    @property
+    def avg_db_ms(self) -> float:
+        return self.db_time * 1000 / self.requests if self.requests else 0.0
+
+
+class RequestProfile:
+    def __init__(self):
+        self.statements = []  # (seconds, statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total(self) -> float:
+        return sum(d for d, _ in self.statements)
+
+    def repeated(self, threshold: int) -> list:
+        shapes = Counter(statement_shape(s) for _, s in self.statements)
+        return [(shape, n) for shape, n in shapes.most_common() if n >= threshold]
+
+
+class SqlProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def init_app(self, app, db) -> None:
+        app.config.setdefault("SQL_PROFILER_ENABLED", True)
+        app.config.setdefault("SQL_PROFILER_HEADERS", None)
+        app.config.setdefault("SQL_N_PLUS_ONE_THRESHOLD", 5)
+        app.config.setdefault("SQL_PROFILER_SLOWEST", 5)
+        if not app.config["SQL_PROFILER_ENABLED"]:
+            return
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    # engine events
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._sql_profiler_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_sql_profiler_start", None)
+        if started is not None and has_request_context():
+            profile = g.get("sql_profile")
+            if profile is not None:
+                profile.statements.append((time.perf_counter() - started, statement))
+
+    # request hooks
+
+    def _start_request(self):
+        g.sql_profile = RequestProfile()
+
+    def _finish_request(self, response):
+        profile = g.pop("sql_profile", None)
+        if profile is None:
+            return response
+
+        config = current_app.config
+        endpoint = request.endpoint or "<unmatched>"
+        repeated = profile.repeated(config["SQL_N_PLUS_ONE_THRESHOLD"])
+        for shape, n in repeated:
+            current_app.logger.warning(
+                "Probable N+1 in %s: %d x %s", endpoint, n, shape[:200]
+            )
+        self._record(endpoint, profile, repeated, config["SQL_PROFILER_SLOWEST"])
+
+        send_headers = config["SQL_PROFILER_HEADERS"]
+        if send_headers is None:
+            send_headers = current_app.debug
+        if send_headers:
+            timing = f'db;dur={profile.total * 1000:.2f};desc="{profile.count} queries"'
+            if repeated:
+                timing += f', n1;desc="{len(repeated)} repeated statements"'
+            response.headers.add("Server-Timing", timing)
+        return response
+
+    def _record(self, endpoint, profile, repeated, keep) -> None:
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.requests += 1
+            stats.queries += profile.count
+            stats.db_time += profile.total
+            stats.max_queries = max(stats.max_queries, profile.count)
+            slowest = sorted(profile.statements, key=lambda s: s[0], reverse=True)[:keep]
+            stats.slowest = sorted(stats.slowest + slowest, key=lambda s: s[0], reverse=True)[:keep]
+            for shape, _ in repeated:
+                stats.n_plus_one[shape] += 1
+
+    def snapshot(self) -> list:
+        """(endpoint, EndpointStats) pairs, most DB time first."""
+        with self._lock:
+            return sorted(self.endpoints.items(), key=lambda item: item[1].db_time, reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.endpoints.clear()
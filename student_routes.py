@@ -1,56 +1,176 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+import hashlib
+from datetime import timezone
+
+from flask import (
+    Blueprint, render_template, redirect, url_for, request, flash, abort,
+    current_app, make_response, session, Response,
+)
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
-from extensions import db
-from models import Course, Enrollment
+from models import Course, Enrollment, WaitlistEntry
 from decorators import roles_required
+from course_search import MAX_RANKED_MATCHES, SearchTooBroad, search_courses
+import enrollment
+from enrollment import EnrollResult
+from extensions import seat_broadcaster
+from grades import gpa
 
 student_bp = Blueprint("student", __name__, url_prefix="/student")
 
+SEAT_STREAM_MAX_COURSES = 200
+
 
 @student_bp.route("/my-classes")
 @login_required
 @roles_required("student")
 def my_classes():
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-    return render_template("student_my_classes.html", enrollments=enrollments)
+    enrollments = (
+        Enrollment.query.options(joinedload(Enrollment.course))
+        .filter_by(student_id=current_user.id)
+        .all()
+    )
+    waitlist = (
+        WaitlistEntry.query.options(joinedload(WaitlistEntry.course))
+        .filter_by(student_id=current_user.id)
+        .order_by(WaitlistEntry.id)
+        .all()
+    )
+    return render_template(
+        "student_my_classes.html", enrollments=enrollments, waitlist=waitlist,
+        gpa=gpa(enrollments),
+    )
 
 
 @student_bp.route("/all-classes")
 @login_required
 @roles_required("student")
 def all_classes():
-    courses = Course.query.order_by(Course.code).all()
-    counts = dict(
-        db.session.query(Enrollment.course_id, func.count(Enrollment.id))
-        .group_by(Enrollment.course_id)
-        .all()
+    # Keyset pagination on the unique course code; seat counts come from the
+    # maintained Course.enrolled_count, so only the visible page is read.
+    page_size = current_app.config["CATALOG_PAGE_SIZE"]
+    after = request.args.get("after", "")
+
+    query = Course.query.options(joinedload(Course.teacher)).order_by(Course.code)
+    if after:
+        query = query.filter(Course.code > after)
+    courses = query.limit(page_size + 1).all()
+    next_after = courses[page_size - 1].code if len(courses) > page_size else None
+    courses = courses[:page_size]
+
+    response = make_response()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    # Pending flashes are part of the page, so never answer 304 over them.
+    if not session.get("_flashes"):
+        response.set_etag(_catalog_etag(courses, after, next_after))
+        if courses:
+            response.last_modified = max(c.updated_at for c in courses).replace(
+                tzinfo=timezone.utc
+            )
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    response.set_data(
+        render_template(
+            "student_all_classes.html", courses=courses, after=after, next_after=next_after
+        )
+    )
+    return response
+
+
+@student_bp.route("/search")
+@login_required
+@roles_required("student")
+def search():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return redirect(url_for("student.all_classes"))
+    try:
+        courses = search_courses(query)
+    except SearchTooBroad:
+        return render_template(
+            "student_all_classes.html", courses=[], query=query, too_broad=MAX_RANKED_MATCHES
+        )
+    return render_template("student_all_classes.html", courses=courses, query=query)
+
+
+@student_bp.route("/seats/stream")
+@login_required
+@roles_required("student")
+def seat_stream():
+    # Server-Sent Events with live seat counts for the courses on the page.
+    # The generator does not touch the database, so no app context is kept
+    # open (and no pooled connection held) for the life of the stream.
+    course_ids = [int(cid) for cid in request.args.get("courses", "").split(",") if cid.isdigit()]
+    subscription = seat_broadcaster.subscribe(course_ids[:SEAT_STREAM_MAX_COURSES] or None)
+    response = Response(
+        seat_broadcaster.stream(subscription, current_app.config["SEAT_EVENTS_HEARTBEAT"]),
+        mimetype="text/event-stream",
     )
-    return render_template("student_all_classes.html", courses=courses, counts=counts)
+    response.cache_control.no_cache = True
+    response.headers["X-Accel-Buffering"] = "no"  # let nginx pass events through
+    return response
+
+
+def _catalog_etag(courses, after, next_after) -> str:
+    digest = hashlib.sha1()
+    digest.update(
+        repr(
+            (current_user.id, current_app.config.get("ENROLLMENT_WAITLIST"), after, next_after)
+        ).encode()
+    )
+    for c in courses:
+        digest.update(
+            repr(
+                (c.id, c.code, c.title, c.capacity, c.enrolled_count, c.teacher.username)
+            ).encode()
+        )
+    return digest.hexdigest()
+
+
+_ENROLL_MESSAGES = {
+    EnrollResult.ENROLLED: ("Enrolled successfully.", "success"),
+    EnrollResult.ALREADY_ENROLLED: ("You are already enrolled in this class.", "warning"),
+    EnrollResult.FULL: ("This class is full.", "error"),
+    EnrollResult.WAITLISTED: ("This class is full. You have been added to the waitlist.", "info"),
+    EnrollResult.ALREADY_WAITLISTED: ("You are already on the waitlist for this class.", "warning"),
+}
 
 
 @student_bp.route("/enroll/<int:course_id>", methods=["POST"])
 @login_required
 @roles_required("student")
 def enroll(course_id: int):
-    course = Course.query.get_or_404(course_id)
+    result = enrollment.enroll(current_user.id, course_id)
+    if result is EnrollResult.NOT_FOUND:
+        abort(404)
 
-    existing = Enrollment.query.filter_by(
-        student_id=current_user.id, course_id=course_id
-    ).first()
-    if existing:
-        flash("You are already enrolled in this class.", "warning")
-        return redirect(url_for("student.all_classes"))
+    message, category = _ENROLL_MESSAGES[result]
+    flash(message, category)
+    if result is EnrollResult.ENROLLED:
+        return redirect(url_for("student.my_classes"))
+    return redirect(url_for("student.all_classes"))
 
-    current_count = Enrollment.query.filter_by(course_id=course_id).count()
-    if current_count >= course.capacity:
-        flash("This class is full.", "error")
-        return redirect(url_for("student.all_classes"))
 
-    enrollment = Enrollment(student_id=current_user.id, course_id=course_id)
-    db.session.add(enrollment)
-    db.session.commit()
+@student_bp.route("/drop/<int:course_id>", methods=["POST"])
+@login_required
+@roles_required("student")
+def drop(course_id: int):
+    if enrollment.drop(current_user.id, course_id):
+        flash("Class dropped.", "info")
+    else:
+        flash("You are not enrolled in this class.", "warning")
+    return redirect(url_for("student.my_classes"))
+
 
-    flash("Enrolled successfully.", "success")
+@student_bp.route("/waitlist/<int:course_id>/leave", methods=["POST"])
+@login_required
+@roles_required("student")
+def leave_waitlist(course_id: int):
+    if enrollment.leave_waitlist(current_user.id, course_id):
+        flash("Removed from the waitlist.", "info")
+    else:
+        flash("You are not on the waitlist for this class.", "warning")
     return redirect(url_for("student.my_classes"))
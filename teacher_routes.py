@@ -1,12 +1,17 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash, abort
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 
 from extensions import db
 from models import Course, Enrollment
 from decorators import roles_required, owns_course_or_admin
+from gradebook import parse_upload, import_grades, FILE_ERROR
+from grades import course_stats
 
 teacher_bp = Blueprint("teacher", __name__, url_prefix="/teacher")
 
+IMPORT_ERRORS_SHOWN = 20
+
 
 @teacher_bp.route("/")
 @login_required
@@ -27,8 +32,14 @@ def course(course_id: int):
         abort(403)
 
     course = Course.query.get_or_404(course_id)
-    roster = Enrollment.query.filter_by(course_id=course_id).all()
-    return render_template("teacher_course.html", course=course, roster=roster)
+    roster = (
+        Enrollment.query.options(joinedload(Enrollment.student))
+        .filter_by(course_id=course_id)
+        .all()
+    )
+    return render_template(
+        "teacher_course.html", course=course, roster=roster, stats=course_stats(course_id)
+    )
 
 
 @teacher_bp.route("/course/<int:course_id>/grade", methods=["POST"])
@@ -49,3 +60,29 @@ def update_grade(course_id: int):
 
     flash("Grade updated.", "success")
     return redirect(url_for("teacher.course", course_id=course_id))
+
+
+@teacher_bp.route("/course/<int:course_id>/grades/import", methods=["POST"])
+@login_required
+@roles_required("teacher", "admin")
+def import_grades_upload(course_id: int):
+    if not owns_course_or_admin(course_id):
+        abort(403)
+
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        flash("Choose a CSV or JSON file to import.", "error")
+        return redirect(url_for("teacher.course", course_id=course_id))
+
+    result = import_grades(course_id, parse_upload(upload))
+
+    flash(
+        f"Imported grades: {result.updated} updated, {result.unchanged} unchanged, "
+        f"{len(result.errors)} rejected.",
+        "success" if not result.errors else "warning",
+    )
+    for row, message in result.errors[:IMPORT_ERRORS_SHOWN]:
+        flash(message if row == FILE_ERROR else f"Row {row}: {message}", "error")
+    if len(result.errors) > IMPORT_ERRORS_SHOWN:
+        flash(f"... and {len(result.errors) - IMPORT_ERRORS_SHOWN} more rejected rows.", "error")
+    return redirect(url_for("teacher.course", course_id=course_id))